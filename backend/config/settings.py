@@ -91,6 +91,58 @@ else:
         }
     }
 
+# --- Cache ---
+# REDIS_URL があれば共有キャッシュ（要 redis パッケージ）、なければプロセス内メモリ
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# --- REST framework ---
+# submit のレート制限（token bucket: "N/period" で容量 N、period ごとに N 補充）。空文字で無効
+REST_FRAMEWORK = {
+    # IP 単位の制限で信用する X-Forwarded-For の段数（Render は前段プロキシ 1 段）。
+    # 未設定（None）だと DRF はクライアントが送った XFF をそのままキーにするので、偽装で制限を抜けられる。
+    # プロキシなしで直接公開するなら 0（REMOTE_ADDR を使う）
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", "1")),
+    "DEFAULT_THROTTLE_RATES": {
+        "submit_user": os.getenv("THROTTLE_SUBMIT_USER", "30/min") or None,
+        "submit_ip": os.getenv("THROTTLE_SUBMIT_IP", "120/min") or None,
+        "submit_global": os.getenv("THROTTLE_SUBMIT_GLOBAL", "50/s") or None,
+    },
+}
+
+# 一括送信（/api/u/submit-bulk/）1 リクエストあたりの最大件数。
+# 新規 entry 1 件 = 1 トークンなので、実際の上限は上の各レートの容量（既定 30）との小さい方
+BULK_SUBMIT_MAX = int(os.getenv("BULK_SUBMIT_MAX", "500"))
+
+# --- Read replica (optional) ---
+# 例: DATABASE_REPLICA_URL=postgres://...
+# ローカル検証: migrate 後に cp db.sqlite3 replica.sqlite3 して DATABASE_REPLICA_URL=sqlite:///replica.sqlite3
+# GET は replica、書き込みとその直後 REPLICA_STICKY_SECONDS 秒の同一 user_hash の読み取りは primary
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+if DATABASE_REPLICA_URL:
+    DATABASES["replica"] = dj_database_url.parse(DATABASE_REPLICA_URL, conn_max_age=600)
+    # テストでは default をそのまま読む
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+    DATABASE_ROUTERS = ["core.db_routing.PrimaryReplicaRouter"]
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index("django.middleware.common.CommonMiddleware"),
+        "core.db_routing.ReplicaRoutingMiddleware",
+    )
+
+# --- Live stats (SSE, ASGI のみ) ---
+# 配信は最短 LIVE_STATS_INTERVAL 秒に 1 回。他プロセスでの書き込みは LIVE_STATS_REFRESH 秒ごとに拾う
+LIVE_STATS_INTERVAL = float(os.getenv("LIVE_STATS_INTERVAL", "2"))
+LIVE_STATS_REFRESH = float(os.getenv("LIVE_STATS_REFRESH", "15"))
+
 # --- I18N ---
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
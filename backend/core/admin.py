@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Dataset, Metric, Item, Value, UserMetric, UserValue
+from .models import (
+    Dataset, Metric, Item, Value, UserMetric, UserValue, UserValueRollup,
+    RankDistribution, RankTier,
+)
 
 admin.site.register(Dataset)
 admin.site.register(Metric)
@@ -7,3 +10,6 @@ admin.site.register(Item)
 admin.site.register(Value)
 admin.site.register(UserMetric)
 admin.site.register(UserValue)
+admin.site.register(UserValueRollup)
+admin.site.register(RankDistribution)
+admin.site.register(RankTier)
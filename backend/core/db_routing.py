@@ -0,0 +1,69 @@
+"""
+Primary / read-replica routing.
+
+Enabled only when ``DATABASE_REPLICA_URL`` is set (see settings). GET/HEAD
+requests read from the ``replica`` alias; everything else, including
+management commands and migrations, stays on ``default``.
+
+Read-your-writes: after a write, ``pin_user(user_hash)`` keeps that
+user's reads on the primary for ``REPLICA_STICKY_SECONDS``. The pin lives
+in the Django cache, so it is shared between workers only when CACHES
+points to a shared backend.
+"""
+from __future__ import annotations
+
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA_ALIAS = "replica"
+PRIMARY_ALIAS = "default"
+
+_use_replica: ContextVar[bool] = ContextVar("use_replica", default=False)
+
+
+def _pin_key(user_hash: str) -> str:
+    return f"dbpin:{user_hash}"
+
+
+def pin_user(user_hash: str) -> None:
+    seconds = getattr(settings, "REPLICA_STICKY_SECONDS", 0)
+    if user_hash and seconds > 0:
+        cache.set(_pin_key(user_hash), 1, timeout=seconds)
+
+
+def is_pinned(user_hash: str) -> bool:
+    return bool(user_hash) and cache.get(_pin_key(user_hash)) is not None
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        use_replica = request.method in ("GET", "HEAD") and not is_pinned(
+            request.GET.get("user_hash", "")
+        )
+        token = _use_replica.set(use_replica)
+        try:
+            return self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and REPLICA_ALIAS in settings.DATABASES:
+            return REPLICA_ALIAS
+        return PRIMARY_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 同じデータのコピーなので、どちらの alias 由来でも関連付けてよい
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_ALIAS
@@ -0,0 +1,166 @@
+"""
+Live UserMetric stats for Server-Sent Events (ASGI only).
+
+One ``_Channel`` per UserMetric owns a single asyncio task. Each tick it
+computes count/mean/std once (plus one query for the subscribers' latest
+values) and fans the result out to every subscriber queue, so N watchers
+cost one computation per tick. Ticks are coalesced: at most one per
+``LIVE_STATS_INTERVAL`` seconds, triggered early by ``notify()`` after a
+local submit, and otherwise every ``LIVE_STATS_REFRESH`` seconds to pick up
+writes from other processes. A failed tick (e.g. the database is briefly
+unreachable) is logged and retried with exponential backoff, capped at
+``LIVE_STATS_REFRESH``, instead of ending the stream.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import UserMetric
+from .user_stats import latest_values, user_metric_stats
+from .views import hensachi
+
+logger = logging.getLogger(__name__)
+
+
+class _Subscriber:
+    __slots__ = ("queue", "user_hash", "last")
+
+    def __init__(self, user_hash: str):
+        # maxsize=1: 読み手が遅れても最新の 1 件だけ残す
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.user_hash = user_hash
+        self.last: Optional[dict] = None
+
+    def offer(self, msg: dict) -> None:
+        if msg == self.last:
+            return
+        self.last = msg
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(msg)
+
+
+def _compute(um: UserMetric, user_hashes: List[str]) -> dict:
+    try:
+        count, mean, std = user_metric_stats(um)
+        latest = latest_values(um, user_hashes) if count else {}
+    finally:
+        close_old_connections()
+    return {"count": count, "mean": mean, "std": std, "latest": latest}
+
+
+class _Channel:
+    def __init__(self, um: UserMetric):
+        self.um = um
+        self.subscribers: Set[_Subscriber] = set()
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def _message(self, stats: dict, sub: _Subscriber) -> dict:
+        mean, std = stats["mean"], stats["std"]
+        msg = {
+            "user_metric": self.um.slug,
+            "count": stats["count"],
+            "mean": None if mean is None else str(mean),
+            "std": None if std is None else str(std),
+            "unit": self.um.unit,
+        }
+        if sub.user_hash:
+            x = stats["latest"].get(sub.user_hash)
+            msg["you"] = (
+                None
+                if x is None or mean is None
+                else {"value": str(x), "hensachi": str(hensachi(x, mean, std))}
+            )
+        return msg
+
+    async def run(self) -> None:
+        interval = settings.LIVE_STATS_INTERVAL
+        refresh = settings.LIVE_STATS_REFRESH
+        last_tick = 0.0
+        failures = 0
+        while self.subscribers:
+            wait = last_tick + interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.wake.clear()
+            last_tick = time.monotonic()
+
+            hashes = sorted({s.user_hash for s in self.subscribers if s.user_hash})
+            try:
+                stats = await sync_to_async(_compute, thread_sensitive=False)(self.um, hashes)
+                for sub in list(self.subscribers):
+                    sub.offer(self._message(stats, sub))
+            except Exception:
+                # タスクが死ぬと購読者全員の配信が止まるので、ログを残して間隔を空けて再試行する
+                failures += 1
+                backoff = min(refresh, interval * 2 ** (failures - 1))
+                logger.exception(
+                    "live stats tick failed for %s (%d in a row), retrying in %.1fs",
+                    self.um.slug, failures, backoff,
+                )
+                await asyncio.sleep(backoff)
+                continue
+            failures = 0
+
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=refresh)
+            except asyncio.TimeoutError:
+                pass
+
+
+_channels: Dict[int, _Channel] = {}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def subscribe(um: UserMetric, user_hash: str = "") -> _Subscriber:
+    """
+    イベントループ上で呼ぶこと
+    """
+    global _loop
+    loop = asyncio.get_running_loop()
+    if _loop is not loop:
+        # テストクライアントなどでループが変わった場合は作り直す
+        _channels.clear()
+        _loop = loop
+
+    ch = _channels.get(um.id)
+    if ch is None:
+        ch = _channels[um.id] = _Channel(um)
+
+    sub = _Subscriber(user_hash)
+    ch.subscribers.add(sub)
+    if ch.task is None or ch.task.done():
+        ch.task = loop.create_task(ch.run())
+    else:
+        ch.wake.set()  # 新しい購読者にすぐ現在値を送る
+    return sub
+
+
+def unsubscribe(um: UserMetric, sub: _Subscriber) -> None:
+    ch = _channels.get(um.id)
+    if ch is None:
+        return
+    ch.subscribers.discard(sub)
+    if not ch.subscribers:
+        if ch.task is not None:
+            ch.task.cancel()
+        _channels.pop(um.id, None)
+
+
+def notify(user_metric_id: int) -> None:
+    """
+    値の追加を同一プロセスの購読者に知らせる（スレッドから呼んでよい）
+    """
+    loop = _loop
+    ch = _channels.get(user_metric_id)
+    if loop is None or ch is None or loop.is_closed():
+        return
+    loop.call_soon_threadsafe(ch.wake.set)
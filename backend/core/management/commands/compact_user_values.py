@@ -0,0 +1,66 @@
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from core.models import UserMetric, UserValue
+from core.user_stats import compact_month, effective_ts, month_start, next_month
+
+
+class Command(BaseCommand):
+    help = "Fold UserValue rows older than N months into monthly per-user rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-months",
+            type=int,
+            default=3,
+            help="直近何か月分を生の行のまま残すか（今月を含む）",
+        )
+        parser.add_argument(
+            "--user-metric",
+            type=str,
+            default="",
+            help="対象の UserMetric slug（省略時は全件）",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        keep = opts["keep_months"]
+        if keep < 1:
+            raise CommandError("--keep-months must be >= 1")
+
+        # cutoff = 残す最古の月の月初（これより前が圧縮対象）
+        cutoff = month_start(timezone.now().date())
+        for _ in range(keep - 1):
+            cutoff = month_start(cutoff - timedelta(days=1))
+
+        ums = UserMetric.objects.order_by("id")
+        if opts["user_metric"]:
+            ums = ums.filter(slug=opts["user_metric"])
+            if not ums.exists():
+                raise CommandError(f"UserMetric not found: {opts['user_metric']}")
+
+        total_rows = 0
+        total_rollups = 0
+        for um in ums:
+            oldest = UserValue.objects.filter(user_metric=um).aggregate(m=Min(effective_ts()))["m"]
+            if oldest is None:
+                continue
+
+            month = month_start(oldest.astimezone(dt_timezone.utc).date())
+            while month < cutoff:
+                if opts["dry_run"]:
+                    self.stdout.write(f"would compact: {um.slug} {month:%Y-%m}")
+                else:
+                    rows, rollups = compact_month(um, month)
+                    total_rows += rows
+                    total_rollups += rollups
+                    if rows:
+                        self.stdout.write(f"{um.slug} {month:%Y-%m}: rows={rows}, rollups={rollups}")
+                month = next_month(month)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"OK: cutoff={cutoff:%Y-%m}, rows_compacted={total_rows}, rollups_written={total_rollups}"
+        ))
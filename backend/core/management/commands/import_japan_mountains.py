@@ -1,9 +1,12 @@
 import csv
+import hashlib
+import io
 from pathlib import Path
 from decimal import Decimal
 
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
+from django.utils import timezone
 
 from core.models import Dataset, Metric, Item, Value
 
@@ -44,12 +47,26 @@ class Command(BaseCommand):
             default="m",
         )
 
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="ファイルが前回と同じ（sha256 一致）でも行ごとの差分チェックを行う",
+        )
+        parser.add_argument(
+            "--keep-missing",
+            action="store_true",
+            help="CSV から消えた行を削除しない",
+        )
+
     @transaction.atomic
     def handle(self, *args, **opts):
         csv_path = Path(opts["csv"]).expanduser().resolve()
         if not csv_path.exists():
             raise CommandError(f"CSV not found: {csv_path}")
 
+        raw = csv_path.read_bytes()
+        file_hash = hashlib.sha256(raw).hexdigest()
+
         ds, _ = Dataset.objects.get_or_create(
             slug=opts["dataset_slug"],
             defaults={"name": opts["dataset_name"], "description": "出典: CSV投入"},
@@ -66,44 +83,97 @@ class Command(BaseCommand):
             },
         )
 
-        created_items = 0
-        upsert_values = 0
-
-        with csv_path.open("r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            required = {"key", "name", "height_m"}
-            if not required.issubset(set(reader.fieldnames or [])):
-                raise CommandError(f"CSV must contain columns: {sorted(required)}")
-
-            for row in reader:
-                key = row["key"].strip()
-                name = row["name"].strip()
-                height_m = row["height_m"].strip()
-                pref = (row.get("pref") or "").strip()
-
-                item, created = Item.objects.get_or_create(
-                    dataset=ds,
-                    key=key,
-                    defaults={"name": name, "meta": {"pref": pref} if pref else {}},
-                )
-                if not created:
-                    # 名前/メタ更新（CSV側が最新とみなす）
-                    item.name = name
-                    if pref:
-                        meta = item.meta or {}
-                        meta["pref"] = pref
-                        item.meta = meta
-                    item.save(update_fields=["name", "meta"])
-                else:
-                    created_items += 1
-
-                v, created_v = Value.objects.update_or_create(
-                    item=item,
-                    metric=metric,
-                    defaults={"value": Decimal(height_m), "source": "japan_mountains.csv"},
-                )
-                upsert_values += 1
+        if metric.source_hash == file_hash and not opts["force"]:
+            self.stdout.write(self.style.SUCCESS(
+                f"OK: unchanged (sha256={file_hash[:12]}), dataset={ds.slug}, metric={metric.key}, csv={csv_path}"
+            ))
+            return
+
+        # CSV を key -> (name, pref, value) に（同じ key は後勝ち）
+        rows = {}
+        reader = csv.DictReader(io.StringIO(raw.decode("utf-8")))
+        required = {"key", "name", "height_m"}
+        if not required.issubset(set(reader.fieldnames or [])):
+            raise CommandError(f"CSV must contain columns: {sorted(required)}")
+        for row in reader:
+            key = row["key"].strip()
+            rows[key] = (
+                row["name"].strip(),
+                (row.get("pref") or "").strip(),
+                Decimal(row["height_m"].strip()),
+            )
+
+        source = "japan_mountains.csv"
+        now = timezone.now()
+        items = {it.key: it for it in Item.objects.filter(dataset=ds)}
+        values = {v.item_id: v for v in Value.objects.filter(metric=metric)}
+
+        # --- Item ---
+        new_items, changed_items = [], []
+        for key, (name, pref, _) in rows.items():
+            item = items.get(key)
+            if item is None:
+                new_items.append(Item(dataset=ds, key=key, name=name, meta={"pref": pref} if pref else {}))
+                continue
+            # 名前/メタ更新（CSV側が最新とみなす）
+            meta = dict(item.meta or {})
+            if pref:
+                meta["pref"] = pref
+            if item.name != name or meta != item.meta:
+                item.name = name
+                item.meta = meta
+                changed_items.append(item)
+
+        Item.objects.bulk_create(new_items, batch_size=1000)
+        Item.objects.bulk_update(changed_items, ["name", "meta"], batch_size=1000)
+        for item in new_items:
+            items[item.key] = item
+        if new_items and new_items[0].pk is None:
+            # bulk_create で pk が返らない DB 向け
+            items = {it.key: it for it in Item.objects.filter(dataset=ds)}
+
+        # --- Value ---
+        new_values, changed_values = [], []
+        for key, (_, _, value) in rows.items():
+            item = items[key]
+            v = values.get(item.pk)
+            if v is None:
+                new_values.append(Value(item=item, metric=metric, value=value, source=source, updated_at=now))
+            elif v.value != value or v.source != source:
+                v.value = value
+                v.source = source
+                v.updated_at = now  # bulk_update では auto_now が効かない
+                changed_values.append(v)
+
+        Value.objects.bulk_create(new_values, batch_size=1000)
+        Value.objects.bulk_update(changed_values, ["value", "source", "updated_at"], batch_size=1000)
+
+        deleted_values = deleted_items = 0
+        if not opts["keep_missing"]:
+            # この metric の値を持っていて CSV から消えた Item
+            key_by_pk = {it.pk: key for key, it in items.items()}
+            gone = [pk for pk in values if key_by_pk.get(pk) not in rows]
+            deleted_values, _ = Value.objects.filter(metric=metric, item_id__in=gone).delete()
+            # 他の metric の値も持たない Item だけ消す
+            deleted_items, _ = (
+                Item.objects.filter(pk__in=gone, values__isnull=True).delete()
+            )
+
+        # スナップショットは item 名も持つので、名前の変更でも bump する
+        changed = bool(new_values or changed_values or deleted_values or changed_items)
+        metric.source_hash = file_hash
+        metric.save(update_fields=["source_hash"])
+        if changed:
+            # bulk 系はシグナルが飛ばないので、まとめて 1 回 bump する
+            Metric.bump_data_version(metric.id)
+        if new_items or changed_items:
+            # 検索インデックス用（削除分は post_delete シグナルで bump 済み）
+            Dataset.bump_data_version(ds.id)
 
+        unchanged = len(rows) - len(new_values) - len(changed_values)
         self.stdout.write(self.style.SUCCESS(
-            f"OK: dataset={ds.slug}, metric={metric.key}, items_created={created_items}, values_upserted={upsert_values}, csv={csv_path}"
+            f"OK: dataset={ds.slug}, metric={metric.key}, "
+            f"items(inserted={len(new_items)}, updated={len(changed_items)}, deleted={deleted_items}), "
+            f"values(inserted={len(new_values)}, updated={len(changed_values)}, "
+            f"deleted={deleted_values}, unchanged={unchanged}), csv={csv_path}"
         ))
@@ -0,0 +1,76 @@
+import csv
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ranks import import_distribution
+
+
+class Command(BaseCommand):
+    help = "Import a game's rank distribution (rank_code,top_percent CSV) for one season"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--csv",
+            type=str,
+            default=str(Path(__file__).resolve().parents[3] / "data" / "apex_rank_season27.csv"),
+            help="CSV with columns rank_code,top_percent",
+        )
+        parser.add_argument("--game", type=str, default="apex-legends")
+        parser.add_argument("--season", type=str, default="27")
+        parser.add_argument("--asof", type=str, default="Dec 2025")
+        parser.add_argument(
+            "--source-name",
+            type=str,
+            default="EsportsTales (compiled from Apex Legends Status)",
+        )
+        parser.add_argument(
+            "--source-url",
+            type=str,
+            default="https://www.esportstales.com/apex-legends/rank-distribution-and-percentage-of-players-by-tier",
+        )
+        parser.add_argument(
+            "--no-current",
+            action="store_true",
+            help="過去シーズンの取り込みなど、現行シーズンを切り替えない場合に指定",
+        )
+
+    def handle(self, *args, **opts):
+        csv_path = Path(opts["csv"]).expanduser().resolve()
+        if not csv_path.exists():
+            raise CommandError(f"CSV not found: {csv_path}")
+
+        rows = []
+        with csv_path.open("r", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            required = {"rank_code", "top_percent"}
+            if not required.issubset(set(reader.fieldnames or [])):
+                raise CommandError(f"CSV must contain columns: {sorted(required)}")
+
+            for row in reader:
+                code = row["rank_code"].strip().lower()
+                try:
+                    top = Decimal(row["top_percent"].strip())
+                except InvalidOperation:
+                    raise CommandError(f"invalid top_percent for {code}: {row['top_percent']}")
+                if not (Decimal("0") <= top <= Decimal("100")):
+                    raise CommandError(f"top_percent out of range for {code}: {top}")
+                rows.append((code, top))
+
+        if not rows:
+            raise CommandError(f"no rows in {csv_path}")
+
+        dist = import_distribution(
+            opts["game"],
+            opts["season"],
+            rows,
+            asof=opts["asof"],
+            source_name=opts["source_name"],
+            source_url=opts["source_url"],
+            make_current=not opts["no_current"],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"OK: game={dist.game}, season={dist.season}, tiers={len(rows)}, current={dist.is_current}, csv={csv_path}"
+        ))
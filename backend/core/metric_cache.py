@@ -0,0 +1,137 @@
+"""
+Per-process cache of sorted Value arrays for each Metric.
+
+Each snapshot is keyed by metric id and tagged with ``Metric.data_version``;
+a lookup whose version differs from the cached one rebuilds the snapshot,
+so "where would x rank" queries cost one Metric fetch plus O(log n) bisects.
+
+``record_hit`` counts requests per metric in the Django cache; warm-up uses
+the counts to pick the most-requested metrics (meaningful only when CACHES
+is shared, i.e. Redis).
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.core.cache import cache
+
+from .models import Metric, Value
+
+
+class MetricSnapshot:
+    __slots__ = ("metric_id", "version", "values", "items", "metas", "by_key", "mean", "std")
+
+    def __init__(self, metric_id: int, version: int, rows: List[Tuple[Decimal, str, str, dict]]):
+        # rows: (value, item_key, item_name, item_meta) sorted ascending by value
+        self.metric_id = metric_id
+        self.version = version
+        self.values: List[Decimal] = [r[0] for r in rows]
+        self.items: List[Tuple[str, str]] = [(r[1], r[2]) for r in rows]
+        self.metas: List[dict] = [r[3] for r in rows]
+        self.by_key: Dict[str, Decimal] = {r[1]: r[0] for r in rows}
+
+        n = len(self.values)
+        if n == 0:
+            self.mean: Optional[Decimal] = None
+            self.std: Optional[Decimal] = None
+            return
+        # population std (matches StdDev("value") used by the aggregate views)
+        mean = sum(self.values, Decimal("0")) / n
+        var = sum(((v - mean) ** 2 for v in self.values), Decimal("0")) / n
+        self.mean = mean
+        self.std = var.sqrt()
+
+    @property
+    def count(self) -> int:
+        return len(self.values)
+
+    def count_above(self, x: Decimal) -> int:
+        return self.count - bisect_right(self.values, x)
+
+    def count_below(self, x: Decimal) -> int:
+        return bisect_left(self.values, x)
+
+    def _entry(self, i: int) -> dict:
+        key, name = self.items[i]
+        return {"key": key, "name": name, "value": str(self.values[i])}
+
+    def descending(self) -> Iterator[Tuple[Decimal, str, str, dict]]:
+        """
+        yields (value, item_key, item_name, item_meta): 値の大きい順、同値は item key 順
+        """
+        hi = self.count
+        while hi > 0:
+            lo = bisect_left(self.values, self.values[hi - 1], 0, hi)
+            for i in range(lo, hi):
+                key, name = self.items[i]
+                yield self.values[i], key, name, self.metas[i]
+            hi = lo
+
+    def neighbors(self, x: Decimal, k: int) -> Tuple[List[dict], List[dict]]:
+        """
+        returns (above, below): up to k items strictly greater / strictly less than x,
+        nearest first.
+        """
+        hi = bisect_right(self.values, x)
+        lo = bisect_left(self.values, x)
+        above = [self._entry(i) for i in range(hi, min(hi + k, self.count))]
+        below = [self._entry(i) for i in range(lo - 1, max(lo - k, 0) - 1, -1)]
+        return above, below
+
+
+_snapshots: Dict[int, MetricSnapshot] = {}
+_lock = Lock()
+
+
+def _build(metric: Metric) -> MetricSnapshot:
+    rows = (
+        Value.objects.filter(metric=metric)
+        .order_by("value", "item__key")
+        .values_list("value", "item__key", "item__name", "item__meta")
+    )
+    return MetricSnapshot(metric.id, metric.data_version, list(rows))
+
+
+def get_snapshot(metric: Metric) -> MetricSnapshot:
+    snap = _snapshots.get(metric.id)
+    if snap is not None and snap.version == metric.data_version:
+        return snap
+
+    with _lock:
+        snap = _snapshots.get(metric.id)
+        if snap is None or snap.version != metric.data_version:
+            snap = _build(metric)
+            _snapshots[metric.id] = snap
+    return snap
+
+
+def clear() -> None:
+    with _lock:
+        _snapshots.clear()
+
+
+def _hit_key(metric_id: int) -> str:
+    return f"metric_hits_{metric_id}"
+
+
+def record_hit(metric_id: int) -> None:
+    """
+    metric を読むリクエストごとに呼ぶ（通常は incr 1 回）
+    """
+    key = _hit_key(metric_id)
+    try:
+        cache.incr(key)
+    except ValueError:  # 未作成
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def hit_counts(metric_ids: List[int]) -> Dict[int, int]:
+    counts = cache.get_many([_hit_key(i) for i in metric_ids])
+    return {i: int(counts.get(_hit_key(i)) or 0) for i in metric_ids}
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_uservalue_user_hash_uservalue_idx_userval_hist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metric',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.2 on 2026-10-19 02:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_metric_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankDistribution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game', models.SlugField()),
+                ('season', models.CharField(max_length=50)),
+                ('asof', models.CharField(blank=True, max_length=100)),
+                ('source_name', models.CharField(blank=True, max_length=200)),
+                ('source_url', models.URLField(blank=True, max_length=500)),
+                ('is_current', models.BooleanField(default=False)),
+                ('imported_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('game', 'season'), name='uniq_rankdist_game_season')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RankTier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField()),
+                ('order', models.PositiveIntegerField()),
+                ('top_percent', models.DecimalField(decimal_places=4, max_digits=7)),
+                ('bottom_percent', models.DecimalField(decimal_places=4, max_digits=7)),
+                ('hensachi', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('distribution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tiers', to='core.rankdistribution')),
+            ],
+            options={
+                'ordering': ['distribution', 'order'],
+                'constraints': [models.UniqueConstraint(fields=('distribution', 'code'), name='uniq_ranktier_code')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.2 on 2026-10-19 02:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_rank_distribution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserValueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_hash', models.CharField(max_length=64)),
+                ('month', models.DateField()),
+                ('count', models.PositiveIntegerField()),
+                ('total', models.DecimalField(decimal_places=6, max_digits=30)),
+                ('total_sq', models.DecimalField(decimal_places=12, max_digits=40)),
+                ('min_value', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('max_value', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('last_id', models.BigIntegerField()),
+                ('last_value', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('last_created_at', models.DateTimeField()),
+                ('user_metric', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='core.usermetric')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_metric', 'user_hash', '-month'], name='idx_rollup_hist')],
+                'constraints': [models.UniqueConstraint(fields=('user_metric', 'user_hash', 'month'), name='uniq_rollup_user_month')],
+            },
+        ),
+    ]
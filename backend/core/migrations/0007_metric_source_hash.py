@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_uservalue_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metric',
+            name='source_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-19 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_metric_source_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uservalue',
+            name='client_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='uservalue',
+            name='client_ts',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='uservalue',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_id__isnull', False)), fields=('user_hash', 'client_id'), name='uniq_userval_client_id'),
+        ),
+    ]
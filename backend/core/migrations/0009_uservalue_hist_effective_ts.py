@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-19 02:35
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_uservalue_client_id'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='uservalue',
+            name='idx_userval_hist',
+        ),
+        migrations.AddIndex(
+            model_name='uservalue',
+            index=models.Index(models.F('user_metric'), models.F('user_hash'), models.OrderBy(django.db.models.functions.comparison.Coalesce('client_ts', 'created_at'), descending=True), name='idx_userval_hist_ts'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+import csv
+from decimal import Decimal
+from math import log, sqrt
+from pathlib import Path
+
+from django.db import migrations
+
+# 以前はコードに埋め込んでいた Apex シーズン 27 の分布を、migrate だけで使える状態にする。
+# 既に import_rank_distribution で取り込み済みなら何もしない。
+# 後のモデル変更で壊れないよう、履歴モデルと偏差値計算の固定コピー（core.ranks と同じ式）を使う。
+
+CSV_PATH = Path(__file__).resolve().parents[2] / "data" / "apex_rank_season27.csv"
+GAME = "apex-legends"
+SEASON = "27"
+
+
+def _inv_norm_cdf(p):
+    # Peter J. Acklam's approximation
+    a = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+         1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00]
+    b = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+         6.680131188771972e+01, -1.328068155288572e+01]
+    c = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+         -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00]
+    d = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+         3.754408661907416e+00]
+    plow = 0.02425
+    phigh = 1 - plow
+
+    if p < plow:
+        q = sqrt(-2 * log(p))
+        return (((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / \
+               ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
+    if p > phigh:
+        q = sqrt(-2 * log(1 - p))
+        return -(((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / \
+                ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
+    q = p - 0.5
+    r = q*q
+    return (((((a[0]*r + a[1])*r + a[2])*r + a[3])*r + a[4])*r + a[5]) * q / \
+           (((((b[0]*r + b[1])*r + b[2])*r + b[3])*r + b[4])*r + 1)
+
+
+def _hensachi_from_top_percent(top_percent):
+    cdf_percent = Decimal("100") - top_percent
+    p = min(max(float(cdf_percent / Decimal("100")), 1e-9), 1 - 1e-9)
+    h = Decimal("50") + Decimal("10") * Decimal(str(_inv_norm_cdf(p)))
+    return h, cdf_percent
+
+
+def seed(apps, schema_editor):
+    RankDistribution = apps.get_model("core", "RankDistribution")
+    RankTier = apps.get_model("core", "RankTier")
+    if RankDistribution.objects.filter(game=GAME, season=SEASON).exists():
+        return
+
+    with CSV_PATH.open("r", encoding="utf-8") as f:
+        rows = [
+            (row["rank_code"].strip().lower(), Decimal(row["top_percent"].strip()))
+            for row in csv.DictReader(f)
+        ]
+    rows.sort(key=lambda r: r[1], reverse=True)  # top% が大きい = 下位 tier
+
+    dist = RankDistribution.objects.create(
+        game=GAME,
+        season=SEASON,
+        asof="Dec 2025",
+        source_name="EsportsTales (compiled from Apex Legends Status)",
+        source_url="https://www.esportstales.com/apex-legends/rank-distribution-and-percentage-of-players-by-tier",
+        # 新しいシーズンが既に現行なら切り替えない
+        is_current=not RankDistribution.objects.filter(game=GAME, is_current=True).exists(),
+    )
+    tiers = []
+    for order, (code, top) in enumerate(rows):
+        h, cdf_percent = _hensachi_from_top_percent(top)
+        tiers.append(
+            RankTier(
+                distribution=dist,
+                code=code,
+                order=order,
+                top_percent=top,
+                bottom_percent=cdf_percent,
+                hensachi=h.quantize(Decimal("0.000001")),
+            )
+        )
+    RankTier.objects.bulk_create(tiers)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_uservalue_hist_effective_ts'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed, migrations.RunPython.noop),
+    ]
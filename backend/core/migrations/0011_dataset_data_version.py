@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_seed_apex_season27'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
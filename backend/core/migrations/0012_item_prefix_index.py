@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# Postgres のみ: 検索（core.search、前方一致 istartswith = UPPER(col) LIKE 'Q%'）用の btree。
+# text_pattern_ops なので照合順序によらず LIKE の前方一致に使える。他の DB では何もしない。
+
+FORWARD = [
+    "CREATE INDEX IF NOT EXISTS idx_item_name_prefix ON core_item (dataset_id, UPPER(name::text) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_item_key_prefix ON core_item (dataset_id, UPPER(key::text) text_pattern_ops)",
+]
+
+BACKWARD = [
+    "DROP INDEX IF EXISTS idx_item_key_prefix",
+    "DROP INDEX IF EXISTS idx_item_name_prefix",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_dataset_data_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FORWARD), _run(BACKWARD)),
+    ]
@@ -1,14 +1,22 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Coalesce
 
 
 class Dataset(models.Model):
     slug = models.SlugField(unique=True)
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
+    # Item の追加/更新/削除のたびに増える（検索インデックスの無効化用）
+    data_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def bump_data_version(cls, dataset_id: int) -> None:
+        cls.objects.filter(pk=dataset_id).update(data_version=models.F("data_version") + 1)
+
 
 class Metric(models.Model):
     VALUE_TYPES = [
@@ -22,6 +30,10 @@ class Metric(models.Model):
     unit = models.CharField(max_length=50, blank=True)
     value_type = models.CharField(max_length=10, choices=VALUE_TYPES, default="float")
     higher_is_better = models.BooleanField(default=True)
+    # Value の追加/更新/削除のたびに増える（キャッシュ無効化用）
+    data_version = models.PositiveIntegerField(default=0)
+    # 最後に取り込んだファイルの sha256（同じファイルの再取り込みを丸ごと省くため）
+    source_hash = models.CharField(max_length=64, blank=True)
 
     class Meta:
         constraints = [
@@ -31,6 +43,10 @@ class Metric(models.Model):
     def __str__(self):
         return f"{self.dataset.slug}:{self.key}"
 
+    @classmethod
+    def bump_data_version(cls, metric_id: int) -> None:
+        cls.objects.filter(pk=metric_id).update(data_version=models.F("data_version") + 1)
+
 
 class Item(models.Model):
     dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name="items")
@@ -86,12 +102,103 @@ class UserValue(models.Model):
     user_hash = models.CharField(max_length=64, db_index=True)  # ログインなし想定の匿名ID
     value = models.DecimalField(max_digits=20, decimal_places=6)
     created_at = models.DateTimeField(auto_now_add=True)
+    # 一括送信（オフライン同期）用: クライアント採番の ID で再送を重複させない
+    client_id = models.CharField(max_length=64, null=True, blank=True)
+    client_ts = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         indexes = [
-            models.Index(fields=["user_metric", "user_hash", "-created_at"], name="idx_userval_hist"),
+            # 履歴は client_ts（あれば）→ created_at の順で並べる（core.user_stats.effective_ts）
+            models.Index(
+                F("user_metric"),
+                F("user_hash"),
+                Coalesce("client_ts", "created_at").desc(),
+                name="idx_userval_hist_ts",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_hash", "client_id"],
+                condition=models.Q(client_id__isnull=False),
+                name="uniq_userval_client_id",
+            )
         ]
 
     def __str__(self):
         return f"{self.user_metric.slug} {self.user_hash}={self.value}"
 
+
+
+class UserValueRollup(models.Model):
+    """
+    compact_user_values で古い月の UserValue を (user_metric, user_hash, month) 単位に畳んだもの。
+    count/total/total_sq から平均・母標準偏差が正確に復元でき、last_* は履歴表示に使う。
+    """
+    user_metric = models.ForeignKey(
+        UserMetric, on_delete=models.CASCADE, related_name="rollups"
+    )
+    user_hash = models.CharField(max_length=64)
+    month = models.DateField()  # 月初日
+    count = models.PositiveIntegerField()
+    total = models.DecimalField(max_digits=30, decimal_places=6)
+    total_sq = models.DecimalField(max_digits=40, decimal_places=12)
+    min_value = models.DecimalField(max_digits=20, decimal_places=6)
+    max_value = models.DecimalField(max_digits=20, decimal_places=6)
+    # 月内で最後の UserValue（id は削除済みだが履歴の key として残す）
+    last_id = models.BigIntegerField()
+    last_value = models.DecimalField(max_digits=20, decimal_places=6)
+    last_created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_metric", "user_hash", "month"], name="uniq_rollup_user_month"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["user_metric", "user_hash", "-month"], name="idx_rollup_hist"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_metric.slug} {self.user_hash} {self.month:%Y-%m} n={self.count}"
+
+
+class RankDistribution(models.Model):
+    """
+    ゲームのランク分布（シーズンごと）。tier ごとの偏差値は取り込み時に計算済み。
+    """
+    game = models.SlugField()  # e.g. "apex-legends"
+    season = models.CharField(max_length=50)
+    asof = models.CharField(max_length=100, blank=True)
+    source_name = models.CharField(max_length=200, blank=True)
+    source_url = models.URLField(max_length=500, blank=True)
+    is_current = models.BooleanField(default=False)
+    imported_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["game", "season"], name="uniq_rankdist_game_season")
+        ]
+
+    def __str__(self):
+        return f"{self.game}:{self.season}"
+
+
+class RankTier(models.Model):
+    distribution = models.ForeignKey(
+        RankDistribution, on_delete=models.CASCADE, related_name="tiers"
+    )
+    code = models.SlugField()  # e.g. "gold-2", "master"
+    order = models.PositiveIntegerField()  # 0 = 最下位
+    top_percent = models.DecimalField(max_digits=7, decimal_places=4)
+    bottom_percent = models.DecimalField(max_digits=7, decimal_places=4)
+    hensachi = models.DecimalField(max_digits=20, decimal_places=6)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["distribution", "code"], name="uniq_ranktier_code")
+        ]
+        ordering = ["distribution", "order"]
+
+    def __str__(self):
+        return f"{self.distribution}:{self.code}"
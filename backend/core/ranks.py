@@ -0,0 +1,256 @@
+"""
+Rank distribution tables (game / season / tier -> top%, bottom%, hensachi).
+
+Hensachi per tier is computed once at import time (``import_distribution``)
+and the tables are served from a per-process cache, so the rank endpoints
+never evaluate the inverse normal CDF per request.
+"""
+from __future__ import annotations
+
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from math import log, sqrt
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+
+from .models import RankDistribution, RankTier
+
+
+def _inv_norm_cdf(p: float) -> float:
+    """
+    Inverse CDF for standard normal distribution.
+    Peter J. Acklam's approximation (commonly used, good accuracy for UI/stats).
+    p must be in (0,1).
+    """
+    # Coefficients in rational approximations.
+    a = [-3.969683028665376e+01,
+         2.209460984245205e+02,
+         -2.759285104469687e+02,
+         1.383577518672690e+02,
+         -3.066479806614716e+01,
+         2.506628277459239e+00]
+
+    b = [-5.447609879822406e+01,
+         1.615858368580409e+02,
+         -1.556989798598866e+02,
+         6.680131188771972e+01,
+         -1.328068155288572e+01]
+
+    c = [-7.784894002430293e-03,
+         -3.223964580411365e-01,
+         -2.400758277161838e+00,
+         -2.549732539343734e+00,
+         4.374664141464968e+00,
+         2.938163982698783e+00]
+
+    d = [7.784695709041462e-03,
+         3.224671290700398e-01,
+         2.445134137142996e+00,
+         3.754408661907416e+00]
+
+    # Define break-points.
+    plow = 0.02425
+    phigh = 1 - plow
+
+    if p <= 0.0 or p >= 1.0:
+        raise ValueError("p must be in (0,1)")
+
+    if p < plow:
+        q = sqrt(-2 * log(p))
+        return (((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / \
+               ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
+    if p > phigh:
+        q = sqrt(-2 * log(1 - p))
+        return -(((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / \
+                ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
+
+    q = p - 0.5
+    r = q*q
+    return (((((a[0]*r + a[1])*r + a[2])*r + a[3])*r + a[4])*r + a[5]) * q / \
+           (((((b[0]*r + b[1])*r + b[2])*r + b[3])*r + b[4])*r + 1)
+
+
+def _hensachi_from_top_percent(top_percent: Decimal) -> Tuple[Decimal, Decimal]:
+    """
+    top_percent: e.g. 23.48 means top 23.48%
+    returns (hensachi, cdf_percent)
+    """
+    # cdf = bottom% = 100 - top%
+    cdf_percent = Decimal("100") - top_percent
+
+    # clamp to avoid p=0 or p=1
+    p = float(cdf_percent / Decimal("100"))
+    eps = 1e-9
+    if p <= 0:
+        p = eps
+    if p >= 1:
+        p = 1 - eps
+
+    z = _inv_norm_cdf(p)
+    h = Decimal("50") + Decimal("10") * Decimal(str(z))
+    return h, cdf_percent
+
+
+def import_distribution(
+    game: str,
+    season: str,
+    rows: Iterable[Tuple[str, Decimal]],
+    *,
+    asof: str = "",
+    source_name: str = "",
+    source_url: str = "",
+    make_current: bool = True,
+) -> RankDistribution:
+    """
+    rows: (rank_code, top_percent)。同じ game/season があれば tier ごと置き換える。
+    """
+    rows = sorted(rows, key=lambda r: r[1], reverse=True)  # top% が大きい = 下位 tier
+    with transaction.atomic():
+        dist, _ = RankDistribution.objects.update_or_create(
+            game=game,
+            season=season,
+            defaults={"asof": asof, "source_name": source_name, "source_url": source_url},
+        )
+        if make_current:
+            RankDistribution.objects.filter(game=game).exclude(pk=dist.pk).update(is_current=False)
+            if not dist.is_current:
+                dist.is_current = True
+                dist.save(update_fields=["is_current"])
+
+        dist.tiers.all().delete()
+        tiers = []
+        for order, (code, top) in enumerate(rows):
+            h, cdf_percent = _hensachi_from_top_percent(top)
+            tiers.append(
+                RankTier(
+                    distribution=dist,
+                    code=code,
+                    order=order,
+                    top_percent=top,
+                    bottom_percent=cdf_percent,
+                    hensachi=h.quantize(Decimal("0.000001")),
+                )
+            )
+        RankTier.objects.bulk_create(tiers)
+
+    invalidate()
+    return dist
+
+
+# ----------------------------
+# Process cache
+# ----------------------------
+
+# 別プロセス（manage.py）での取り込みを拾うため、一定時間で読み直す
+CACHE_TTL = float(os.getenv("RANK_CACHE_TTL", "300"))
+
+_lock = Lock()
+_loaded_at: float = 0.0
+# game -> season -> table
+_tables: Dict[str, Dict[str, dict]] = {}
+# game -> current season
+_current: Dict[str, str] = {}
+# game -> seasons（古い順）
+_seasons: Dict[str, List[str]] = {}
+
+
+def _season_sort_key(d: RankDistribution) -> tuple:
+    """
+    "9" < "10" になるよう数値として並べる。数値でないシーズンはその後ろに取り込み順で
+    """
+    try:
+        return (0, Decimal(d.season), d.imported_at)
+    except InvalidOperation:
+        return (1, Decimal(0), d.imported_at)
+
+
+def _percent_str(d: Decimal) -> str:
+    """
+    DB の Decimal(…, 4) を取り込み時の表記に戻す: 57.5500 -> "57.55", 100.0000 -> "100"
+    """
+    return format(d.normalize(), "f")
+
+
+def _load() -> None:
+    global _loaded_at, _tables, _current, _seasons
+    tables: Dict[str, Dict[str, dict]] = {}
+    current: Dict[str, str] = {}
+
+    dists = {d.id: d for d in RankDistribution.objects.all()}
+    for d in dists.values():
+        tables.setdefault(d.game, {})[d.season] = {
+            "game": d.game,
+            "season": d.season,
+            "meta": {
+                "season": d.season,
+                "asof": d.asof,
+                "source_name": d.source_name,
+                "source_url": d.source_url,
+            },
+            "tiers": {},
+            "order": [],
+        }
+        if d.is_current:
+            current[d.game] = d.season
+
+    for t in RankTier.objects.order_by("distribution_id", "order").values(
+        "distribution_id", "code", "top_percent", "bottom_percent", "hensachi"
+    ):
+        d = dists[t["distribution_id"]]
+        table = tables[d.game][d.season]
+        table["tiers"][t["code"]] = {
+            "rank_code": t["code"],
+            "top_percent": _percent_str(t["top_percent"]),
+            "bottom_percent": _percent_str(t["bottom_percent"]),
+            "hensachi": str(t["hensachi"]),
+        }
+        table["order"].append(t["code"])
+
+    seasons_by_game: Dict[str, List[str]] = {}
+    for d in sorted(dists.values(), key=_season_sort_key):
+        seasons_by_game.setdefault(d.game, []).append(d.season)
+
+    # 読み取り側がロックなしで参照できるよう、dict ごと差し替える
+    _tables = tables
+    _current = current
+    _seasons = seasons_by_game
+    _loaded_at = time.monotonic()
+
+
+def _ensure_loaded() -> None:
+    if _loaded_at and time.monotonic() - _loaded_at < CACHE_TTL:
+        return
+    with _lock:
+        if not _loaded_at or time.monotonic() - _loaded_at >= CACHE_TTL:
+            _load()
+
+
+def preload() -> None:
+    _ensure_loaded()
+
+
+def invalidate() -> None:
+    global _loaded_at
+    with _lock:
+        _loaded_at = 0.0
+
+
+def seasons(game: str) -> List[str]:
+    _ensure_loaded()
+    return list(_seasons.get(game, []))
+
+
+def get_table(game: str, season: Optional[str] = None) -> Optional[dict]:
+    """
+    season=None なら現行シーズン。見つからなければ None。
+    """
+    _ensure_loaded()
+    by_season = _tables.get(game)
+    if not by_season:
+        return None
+    if not season:
+        season = _current.get(game)
+    return by_season.get(season) if season else None
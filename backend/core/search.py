@@ -0,0 +1,78 @@
+"""
+Item name/key prefix search within a dataset.
+
+Both backends match case-insensitive prefixes of name or key and return
+the shortest names first. On Postgres the lookup is an ``istartswith``
+(``UPPER(col) LIKE 'Q%'``) served by the ``text_pattern_ops`` indexes from
+migration 0012. Elsewhere (SQLite in local dev) a per-dataset in-memory
+prefix index (sorted lowercase names/keys + bisect) stands in, tagged with
+``Dataset.data_version`` and rebuilt when the version changes.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from django.db import connections, router
+from django.db.models import Q, QuerySet
+from django.db.models.functions import Length
+
+from .models import Dataset, Item
+
+
+class _PrefixIndex:
+    __slots__ = ("version", "terms", "ids", "names")
+
+    def __init__(self, version: int, rows: List[Tuple[int, str, str]]):
+        pairs = []
+        for pk, key, name in rows:
+            pairs.append((name.lower(), pk))
+            pairs.append((key.lower(), pk))
+        pairs.sort()
+        self.version = version
+        self.terms = [t for t, _ in pairs]
+        self.ids = [pk for _, pk in pairs]
+        self.names = {pk: name for pk, _, name in rows}
+
+    def lookup(self, prefix: str, limit: int) -> List[int]:
+        """
+        Postgres 側と同じく、一致した全件を (名前の長さ, 名前) 順に並べて先頭 limit 件
+        """
+        prefix = prefix.lower()
+        matched = set()
+        i = bisect_left(self.terms, prefix)
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            matched.add(self.ids[i])
+            i += 1
+        return sorted(matched, key=lambda pk: (len(self.names[pk]), self.names[pk]))[:limit]
+
+
+_indexes: Dict[int, _PrefixIndex] = {}
+_lock = Lock()
+
+
+def _prefix_index(ds: Dataset) -> _PrefixIndex:
+    idx = _indexes.get(ds.id)
+    if idx is not None and idx.version == ds.data_version:
+        return idx
+    with _lock:
+        idx = _indexes.get(ds.id)
+        if idx is None or idx.version != ds.data_version:
+            idx = _PrefixIndex(
+                ds.data_version,
+                list(Item.objects.filter(dataset=ds).values_list("id", "key", "name")),
+            )
+            _indexes[ds.id] = idx
+    return idx
+
+
+def search_items(ds: Dataset, q: str, limit: int) -> QuerySet:
+    """
+    returns 最大 limit 件の Item。1 クエリで評価される（ds.data_version は最新を渡すこと）
+    """
+    if connections[router.db_for_read(Item)].vendor == "postgresql":
+        qs = Item.objects.filter(dataset=ds).filter(Q(name__istartswith=q) | Q(key__istartswith=q))
+    else:
+        qs = Item.objects.filter(id__in=_prefix_index(ds).lookup(q, limit))
+    return qs.order_by(Length("name"), "name")[:limit]
@@ -24,3 +24,10 @@ class UserValueCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserValue
         fields = ["user_metric", "user_hash", "value"]
+
+
+class BulkUserValueEntrySerializer(serializers.Serializer):
+    user_metric = serializers.SlugField()
+    value = serializers.DecimalField(max_digits=20, decimal_places=6)
+    client_id = serializers.CharField(max_length=64)
+    client_ts = serializers.DateTimeField(required=False, allow_null=True)
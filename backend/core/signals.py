@@ -0,0 +1,41 @@
+import sys
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Dataset, Item, Metric, UserValue, Value
+
+
+@receiver(post_save, sender=Value)
+@receiver(post_delete, sender=Value)
+def bump_metric_data_version(sender, instance: Value, **kwargs):
+    # bulk_create / QuerySet.update ではシグナルが飛ばないので、呼び出し側で bump すること
+    Metric.bump_data_version(instance.metric_id)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def bump_dataset_data_version(sender, instance: Item, **kwargs):
+    # 同上: bulk 系のあとは呼び出し側で Dataset.bump_data_version を呼ぶ
+    Dataset.bump_data_version(instance.dataset_id)
+    # metric のスナップショットも item の名前/meta を持っている
+    Metric.objects.filter(dataset_id=instance.dataset_id).update(data_version=F("data_version") + 1)
+
+
+def notify_live_stats_changed(user_metric_id: int) -> None:
+    """
+    コミット後に SSE 購読者へ知らせる。bulk_create のあとは呼び出し側で呼ぶこと
+    """
+    # live は SSE 接続があるときだけ import される。未 import なら購読者もいない
+    live = sys.modules.get("core.live")
+    if live is None:
+        return
+    transaction.on_commit(lambda: live.notify(user_metric_id))
+
+
+@receiver(post_save, sender=UserValue)
+def notify_live_stats(sender, instance: UserValue, created: bool, **kwargs):
+    if created:
+        notify_live_stats_changed(instance.user_metric_id)
@@ -1,3 +1,524 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import live, metric_cache, ranks, user_stats, warmup
+from .models import Dataset, Item, Metric, UserMetric, UserValue, UserValueRollup, Value
+
+
+def _rates(user="5/min", ip=None, global_="20/min"):
+    return {
+        "NUM_PROXIES": 1,
+        "DEFAULT_THROTTLE_RATES": {
+            "submit_user": user,
+            "submit_ip": ip,
+            "submit_global": global_,
+        }
+    }
+
+
+class SubmitThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.um = UserMetric.objects.create(slug="sleep", name="sleep")
+
+    def submit(self, user_hash, ip="10.0.0.1"):
+        return self.client.post(
+            "/api/u/sleep/submit/",
+            {"user_hash": user_hash, "value": 7},
+            content_type="application/json",
+            REMOTE_ADDR=ip,
+        )
+
+    @override_settings(REST_FRAMEWORK=_rates())
+    def test_throttled_client_does_not_drain_global_bucket(self):
+        codes = [self.submit("flooder").status_code for _ in range(30)]
+        self.assertEqual(codes[:5], [201] * 5)
+        self.assertEqual(set(codes[5:]), {429})
+
+        res = self.submit("someone-else", ip="10.0.0.2")
+        self.assertEqual(res.status_code, 201)
+
+        counts = self.client.get("/api/ops/throttle/").json()["throttled"]
+        self.assertEqual(counts["submit_user"], 25)
+        self.assertEqual(counts["submit_global"], 0)
+
+    @override_settings(REST_FRAMEWORK=_rates(user=None, ip="2/min", global_=None))
+    def test_spoofed_forwarded_for_shares_the_client_ip_bucket(self):
+        codes = [
+            self.client.post(
+                "/api/u/sleep/submit/",
+                {"user_hash": f"u{i}", "value": 7},
+                content_type="application/json",
+                # 先頭はクライアントが付けた偽の値、末尾は前段プロキシが付けた接続元
+                HTTP_X_FORWARDED_FOR=f"203.0.113.{i}, 198.51.100.7",
+            ).status_code
+            for i in range(6)
+        ]
+        self.assertEqual(codes, [201, 201, 429, 429, 429, 429])
+
+    @override_settings(REST_FRAMEWORK=_rates(user="100/min", global_="3/min"))
+    def test_global_bucket_sheds_load_with_retry_after(self):
+        for i in range(3):
+            self.assertEqual(self.submit(f"u{i}").status_code, 201)
+        res = self.submit("u3")
+        self.assertEqual(res.status_code, 429)
+        self.assertIn("Retry-After", res.headers)
+        self.assertEqual(UserValue.objects.count(), 3)
+
+    @override_settings(REST_FRAMEWORK=_rates(user="5/min", global_="100/min"))
+    def test_bulk_submit_is_charged_per_entry(self):
+        def bulk(n, prefix):
+            return self.client.post(
+                "/api/u/submit-bulk/",
+                {
+                    "user_hash": "bulker",
+                    "entries": [
+                        {"user_metric": "sleep", "value": 7, "client_id": f"{prefix}-{i}"}
+                        for i in range(n)
+                    ],
+                },
+                content_type="application/json",
+            )
+
+        # 容量（5）を超える件数は待っても通らないので 400 で上限を返す
+        res = bulk(6, "big")
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("max 5", res.json()["detail"])
+        self.assertEqual(UserValue.objects.count(), 0)
+
+        self.assertEqual(bulk(3, "a").status_code, 200)
+        res = bulk(3, "b")  # 残り 2 トークンでは 3 件を払えない
+        self.assertEqual(res.status_code, 429)
+        self.assertIn("Retry-After", res.headers)
+        self.assertEqual(UserValue.objects.count(), 3)
+
+        # 応答を失った後の再送: 登録済みの 3 件は課金されない（1 トークンだけ）
+        res = bulk(3, "a")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["duplicate"], 3)
+        self.assertEqual(bulk(1, "c").status_code, 200)
+        self.assertEqual(bulk(1, "d").status_code, 429)
+
+
+@override_settings(REST_FRAMEWORK=_rates(user=None, global_=None))
+class BulkSubmitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.um = UserMetric.objects.create(slug="sleep", name="sleep")
+
+    def bulk(self, entries, user_hash="abc"):
+        return self.client.post(
+            "/api/u/submit-bulk/",
+            {"user_hash": user_hash, "entries": entries},
+            content_type="application/json",
+        )
+
+    def history(self, user_hash="abc"):
+        res = self.client.get(f"/api/u/sleep/history/?user_hash={user_hash}")
+        return [row["value"] for row in res.json()["items"]]
+
+    def test_resend_is_idempotent(self):
+        entries = [
+            {"user_metric": "sleep", "value": 7, "client_id": "c1"},
+            {"user_metric": "sleep", "value": 8, "client_id": "c2"},
+            {"user_metric": "sleep", "value": 9, "client_id": "c2"},
+        ]
+        first = self.bulk(entries).json()
+        self.assertEqual((first["created"], first["duplicate"]), (2, 1))
+
+        again = self.bulk(entries).json()
+        self.assertEqual((again["created"], again["duplicate"]), (0, 3))
+        self.assertEqual(UserValue.objects.count(), 2)
+
+        # 別ユーザーの同じ client_id は別物
+        other = self.bulk(entries[:1], user_hash="xyz").json()
+        self.assertEqual(other["created"], 1)
+
+    def test_backfill_is_ordered_by_client_ts(self):
+        now = timezone.now()
+        self.client.post(
+            "/api/u/sleep/submit/",
+            {"user_hash": "abc", "value": 6},
+            content_type="application/json",
+        )
+        self.bulk(
+            [
+                {"user_metric": "sleep", "value": 1, "client_id": "old",
+                 "client_ts": (now - timedelta(days=3)).isoformat()},
+                {"user_metric": "sleep", "value": 2, "client_id": "older",
+                 "client_ts": (now - timedelta(days=5)).isoformat()},
+            ]
+        )
+        self.assertEqual(self.history(), ["6.000000", "1.000000", "2.000000"])
+
+    def test_rejects_future_and_compacted_client_ts(self):
+        now = timezone.now()
+        last_month = (now.date().replace(day=1) - timedelta(days=1)).replace(day=1)
+        UserValueRollup.objects.create(
+            user_metric=self.um, user_hash="abc", month=last_month, count=1,
+            total=5, total_sq=25, min_value=5, max_value=5,
+            last_id=0, last_value=5, last_created_at=now - timedelta(days=40),
+        )
+
+        res = self.bulk(
+            [
+                {"user_metric": "sleep", "value": 1, "client_id": "future",
+                 "client_ts": (now + timedelta(days=1)).isoformat()},
+                {"user_metric": "sleep", "value": 2, "client_id": "compacted",
+                 "client_ts": (now - timedelta(days=45)).isoformat()},
+                {"user_metric": "sleep", "value": 3, "client_id": "ok",
+                 "client_ts": now.replace(day=1, hour=0, minute=0, second=1).isoformat()},
+            ]
+        ).json()
+        self.assertEqual([r["status"] for r in res["results"]], ["invalid", "invalid", "created"])
+        self.assertIn("client_ts", res["results"][0]["errors"])
+        self.assertIn("client_ts", res["results"][1]["errors"])
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        self.um = UserMetric.objects.create(slug="sleep", name="sleep")
+        now = timezone.now()
+        self.this_month = now.date().replace(day=1)
+        self.last_month = (self.this_month - timedelta(days=1)).replace(day=1)
+        old = datetime(self.last_month.year, self.last_month.month, 10, tzinfo=dt_timezone.utc)
+        for i, (user_hash, value) in enumerate([("a", 1), ("a", 3), ("b", 2)]):
+            uv = UserValue.objects.create(user_metric=self.um, user_hash=user_hash, value=value)
+            UserValue.objects.filter(pk=uv.pk).update(created_at=old + timedelta(hours=i))
+        UserValue.objects.create(user_metric=self.um, user_hash="a", value=6)
+
+    def test_compaction_keeps_stats_exact(self):
+        before = user_stats.user_metric_stats(self.um)
+        self.assertEqual(before[:2], (4, Decimal("3")))
+
+        self.assertEqual(user_stats.compact_month(self.um, self.last_month), (3, 2))
+        self.assertEqual(UserValue.objects.count(), 1)
+        self.assertEqual(user_stats.user_metric_stats(self.um), before)
+
+        rollup = UserValueRollup.objects.get(user_hash="a")
+        self.assertEqual((rollup.count, rollup.total, rollup.min_value, rollup.max_value),
+                         (2, 4, 1, 3))
+        # 再実行しても何も起きない
+        self.assertEqual(user_stats.compact_month(self.um, self.last_month), (0, 0))
+
+    def test_row_committed_after_aggregation_is_not_deleted(self):
+        late_ts = datetime(self.last_month.year, self.last_month.month, 20, tzinfo=dt_timezone.utc)
+        bulk_create = UserValueRollup.objects.bulk_create
+
+        def insert_then_bulk_create(*args, **kwargs):
+            # 集計の後、rollup の書き込み前に同じ月の値が届いた場合
+            UserValue.objects.create(user_metric=self.um, user_hash="c", value=9, client_ts=late_ts)
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(UserValueRollup.objects, "bulk_create", insert_then_bulk_create):
+            user_stats.compact_month(self.um, self.last_month)
+
+        self.assertTrue(UserValue.objects.filter(user_hash="c").exists())
+        self.assertEqual(user_stats.user_metric_stats(self.um)[0], 5)
+
+    def test_history_falls_back_to_rollups(self):
+        user_stats.compact_month(self.um, self.last_month)
+        history = user_stats.user_history(self.um, "a", 5)
+        self.assertEqual([row["value"] for row in history], ["6.000000", "3.000000"])
+        self.assertEqual([row["value"] for row in user_stats.user_history(self.um, "a", 1)],
+                         ["6.000000"])
+
+
+class UserMetricExportTests(TestCase):
+    def setUp(self):
+        um = UserMetric.objects.create(slug="sleep", name="sleep", privacy="public")
+        for user_hash, value in [("alice", 7), ("bob", 6), ("alice", 8)]:
+            UserValue.objects.create(user_metric=um, user_hash=user_hash, value=value)
+
+    def export(self):
+        res = self.client.get("/api/u/sleep/export/?format=ndjson")
+        body = b"".join(res.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_user_hash_is_replaced_by_stable_pseudonym(self):
+        rows = self.export()
+        self.assertNotIn("user_hash", rows[0])
+        self.assertNotIn("alice", json.dumps(rows))
+        self.assertEqual(rows[0]["user"], rows[2]["user"])
+        self.assertNotEqual(rows[0]["user"], rows[1]["user"])
+        # 差分取得どうしで突き合わせられるよう、エクスポートをまたいで同じ
+        self.assertEqual(self.export()[0]["user"], rows[0]["user"])
+
+    def test_client_ts_column(self):
+        ts = timezone.now() - timedelta(days=1)
+        UserValue.objects.create(
+            user_metric=UserMetric.objects.get(slug="sleep"), user_hash="alice", value=5,
+            client_id="c1", client_ts=ts,
+        )
+        rows = self.export()
+        self.assertIsNone(rows[0]["client_ts"])
+        self.assertEqual(rows[-1]["client_ts"], ts.isoformat())
+
+
+class RankTests(TestCase):
+    def setUp(self):
+        ranks.invalidate()
+
+    def test_season27_is_seeded_by_migration(self):
+        res = self.client.get("/api/apex/rank/hensachi/gold-2/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["meta"]["season"], "27")
+
+    def test_seeded_tiers_match_import_distribution(self):
+        seeded = self.client.get("/api/ranks/apex-legends/").json()["tiers"]
+        ranks.import_distribution(
+            "apex-legends", "27",
+            [(t["rank_code"], Decimal(t["top_percent"])) for t in seeded],
+        )
+        self.assertEqual(self.client.get("/api/ranks/apex-legends/").json()["tiers"], seeded)
+
+    def test_percents_keep_imported_precision(self):
+        ranks.import_distribution("test-game", "1", [("low", Decimal("100")), ("mid", Decimal("57.55"))])
+        tiers = self.client.get("/api/ranks/test-game/").json()["tiers"]
+        self.assertEqual(
+            [(t["top_percent"], t["bottom_percent"]) for t in tiers],
+            [("100", "0"), ("57.55", "42.45")],
+        )
+
+    def test_seasons_sort_numerically(self):
+        for season in ["10", "9", "2024-split1", "27"]:
+            ranks.import_distribution("test-game", season, [("gold", Decimal("50"))])
+        self.assertEqual(ranks.seasons("test-game"), ["9", "10", "27", "2024-split1"])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.ds = Dataset.objects.create(slug="mountains", name="mountains")
+        for key, name in [("fuji", "Fuji"), ("kitadake", "Kitadake"), ("ontake", "Ontake"),
+                          ("fujiwara", "Fujiwara-dake")]:
+            Item.objects.create(dataset=self.ds, key=key, name=name)
+
+    def search(self, q):
+        res = self.client.get(f"/api/datasets/mountains/search/?q={q}")
+        return [row["key"] for row in res.json()["results"]]
+
+    def test_prefix_match_on_name_or_key(self):
+        self.assertEqual(self.search("FU"), ["fuji", "fujiwara"])
+        self.assertEqual(self.search("take"), [])  # 部分一致はしない
+        self.assertEqual(self.search("k"), ["kitadake"])
+
+    def test_index_follows_item_changes(self):
+        self.assertEqual(self.search("on"), ["ontake"])
+        Item.objects.create(dataset=self.ds, key="ontake-2", name="On")
+        Item.objects.filter(key="ontake").get().delete()
+        self.assertEqual(self.search("on"), ["ontake-2"])
+
+
+class MetricHensachiTests(TestCase):
+    def setUp(self):
+        metric_cache.clear()
+        ds = Dataset.objects.create(slug="mountains", name="mountains")
+        self.metric = Metric.objects.create(dataset=ds, key="height_m", name="height", unit="m")
+        for key, value in [("a", 10), ("b", 30), ("c", 20), ("d", 30)]:
+            item = Item.objects.create(dataset=ds, key=key, name=key.upper(), meta={"k": key})
+            Value.objects.create(item=item, metric=self.metric, value=value)
+
+    def get(self):
+        return self.client.get("/api/datasets/mountains/metrics/height_m/hensachi/").json()
+
+    def test_ranking_from_warm_snapshot(self):
+        self.metric.refresh_from_db()
+        metric_cache.get_snapshot(self.metric)  # warm-up 相当
+        with self.assertNumQueries(1):  # Metric の取得だけ
+            body = self.get()
+        self.assertEqual(body["count"], 4)
+        self.assertEqual(Decimal(body["mean"]), Decimal("22.5"))
+        # 高い順、同値は key 順
+        self.assertEqual([r["item"]["key"] for r in body["results"]], ["b", "d", "c", "a"])
+        self.assertEqual(body["results"][0]["item"], {"key": "b", "name": "B", "meta": {"k": "b"}})
+
+    def test_item_changes_refresh_the_snapshot(self):
+        self.get()
+        item = Item.objects.get(key="a")
+        item.name = "Renamed"
+        item.save()
+        self.assertEqual(self.get()["results"][-1]["item"]["name"], "Renamed")
+
+
+class MetricValueHensachiTests(TestCase):
+    def setUp(self):
+        metric_cache.clear()
+        self.ds = Dataset.objects.create(slug="mountains", name="mountains")
+        self.metric = Metric.objects.create(dataset=self.ds, key="height_m", name="height")
+        for key, value in [("a", 10), ("b", 20), ("c", 20), ("d", 30), ("e", 40)]:
+            item = Item.objects.create(dataset=self.ds, key=key, name=key)
+            Value.objects.create(item=item, metric=self.metric, value=value)
+
+    def lookup(self, x, neighbors=1):
+        return self.client.get(
+            f"/api/datasets/mountains/metrics/height_m/hensachi/{x}/?neighbors={neighbors}"
+        ).json()
+
+    def test_rank_counts_only_strictly_better_values(self):
+        body = self.lookup(20)
+        self.assertEqual((body["rank"], body["count"], body["top_percent"]), (3, 5, "50.00"))
+        self.assertEqual(self.lookup(45)["rank"], 1)
+        self.assertEqual(self.lookup(5)["rank"], 6)
+
+    def test_lower_is_better(self):
+        self.metric.higher_is_better = False
+        self.metric.save()
+        self.assertEqual(self.lookup(20)["rank"], 2)
+        self.assertEqual(self.lookup(5)["rank"], 1)
+
+    def test_neighbors_exclude_ties_and_are_nearest_first(self):
+        body = self.lookup(20, neighbors=2)
+        self.assertEqual([r["key"] for r in body["above"]], ["d", "e"])
+        self.assertEqual([r["key"] for r in body["below"]], ["a"])
+        body = self.lookup(25, neighbors=2)
+        self.assertEqual([r["key"] for r in body["below"]], ["c", "b"])
+        self.assertEqual(self.lookup(25, neighbors=0)["above"], [])
+
+    def test_snapshot_is_reused_until_data_version_changes(self):
+        self.metric.refresh_from_db()
+        snap = metric_cache.get_snapshot(self.metric)
+        self.assertIs(metric_cache.get_snapshot(self.metric), snap)
+
+        item = Item.objects.create(dataset=self.ds, key="f", name="f")
+        Value.objects.create(item=item, metric=self.metric, value=50)
+        self.metric.refresh_from_db()
+        rebuilt = metric_cache.get_snapshot(self.metric)
+        self.assertIsNot(rebuilt, snap)
+        self.assertEqual(rebuilt.count, 6)
+        self.assertEqual(self.lookup(45)["rank"], 2)
+
+
+class ImportJapanMountainsTests(TestCase):
+    ROWS = [("fuji", "富士山", "3776"), ("kita", "北岳", "3193"), ("oku", "奥穂高岳", "3190")]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.csv = Path(tmp.name) / "japan_mountains.csv"
+        self.write(self.ROWS)
+
+    def write(self, rows):
+        lines = ["key,name,pref,height_m"] + [f"{k},{n},,{h}" for k, n, h in rows]
+        self.csv.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    def run_import(self, *args):
+        out = io.StringIO()
+        call_command("import_japan_mountains", "--csv", str(self.csv), *args, stdout=out)
+        return out.getvalue()
+
+    def versions(self):
+        metric = Metric.objects.select_related("dataset").get(key="height_m")
+        return metric.data_version, metric.dataset.data_version
+
+    def test_first_import_inserts_and_bumps_versions(self):
+        out = self.run_import()
+        self.assertIn("items(inserted=3, updated=0, deleted=0)", out)
+        self.assertIn("values(inserted=3, updated=0, deleted=0, unchanged=0)", out)
+        self.assertEqual(Value.objects.count(), 3)
+        metric_version, dataset_version = self.versions()
+        self.assertGreater(metric_version, 0)
+        self.assertGreater(dataset_version, 0)
+
+    def test_same_file_is_skipped_by_hash(self):
+        self.run_import()
+        before = self.versions()
+        self.assertIn("OK: unchanged", self.run_import())
+        self.assertEqual(self.versions(), before)
+
+    def test_force_without_changes_writes_nothing(self):
+        self.run_import()
+        before = self.versions()
+        updated_at = dict(Value.objects.values_list("id", "updated_at"))
+
+        out = self.run_import("--force")
+        self.assertIn("items(inserted=0, updated=0, deleted=0)", out)
+        self.assertIn("values(inserted=0, updated=0, deleted=0, unchanged=3)", out)
+        self.assertEqual(self.versions(), before)
+        self.assertEqual(dict(Value.objects.values_list("id", "updated_at")), updated_at)
+
+    def test_insert_update_delete(self):
+        self.run_import()
+        before = self.versions()
+        self.write([("fuji", "富士山", "3776.12"), ("kita", "北岳（白峰）", "3193"), ("yari", "槍ヶ岳", "3180")])
+
+        out = self.run_import()
+        self.assertIn("items(inserted=1, updated=1, deleted=1)", out)
+        self.assertIn("values(inserted=1, updated=1, deleted=1, unchanged=1)", out)
+        self.assertEqual(
+            dict(Value.objects.values_list("item__key", "value")),
+            {"fuji": Decimal("3776.12"), "kita": Decimal("3193"), "yari": Decimal("3180")},
+        )
+        self.assertFalse(Item.objects.filter(key="oku").exists())
+        metric_version, dataset_version = self.versions()
+        self.assertGreater(metric_version, before[0])
+        self.assertGreater(dataset_version, before[1])
+
+    def test_keep_missing(self):
+        self.run_import()
+        self.write(self.ROWS[:2])
+        out = self.run_import("--keep-missing")
+        self.assertIn("values(inserted=0, updated=0, deleted=0, unchanged=2)", out)
+        self.assertTrue(Value.objects.filter(item__key="oku").exists())
+
+
+class WarmupTargetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        ds = Dataset.objects.create(slug="mountains", name="mountains")
+        self.metrics = [Metric.objects.create(dataset=ds, key=f"m{i}", name=f"m{i}") for i in range(4)]
+
+    def test_most_requested_metrics_first(self):
+        for _ in range(3):
+            self.client.get("/api/datasets/mountains/metrics/m2/hensachi/1/")
+        self.client.get("/api/datasets/mountains/metrics/m3/hensachi/1/")
+
+        with mock.patch.dict("os.environ", {"WARMUP_MAX_METRICS": "3"}):
+            keys = [m.key for m in warmup._target_metrics()]
+        # 残り 1 枠は id 順の埋め合わせ
+        self.assertEqual(keys, ["m2", "m3", "m0"])
+
+
+class UserMetricStreamTests(TestCase):
+    def test_stream_refuses_wsgi(self):
+        UserMetric.objects.create(slug="sleep", name="sleep")
+        # テストクライアントは WSGI 経由
+        res = self.client.get("/api/u/sleep/stream/")
+        self.assertEqual(res.status_code, 501)
+
+    async def test_stream_passes_asgi_check(self):
+        # ASGI なら判定を通過する（ストリームは終わらないので、存在しない slug で確かめる）
+        res = await self.async_client.get("/api/u/missing/stream/")
+        self.assertEqual(res.status_code, 404)
+
+
+@override_settings(LIVE_STATS_INTERVAL=0.01, LIVE_STATS_REFRESH=0.05)
+class LiveChannelTests(SimpleTestCase):
+    def test_channel_survives_failed_tick(self):
+        stats = {"count": 1, "mean": Decimal("7"), "std": Decimal("0"), "latest": {}}
+        compute = mock.Mock(side_effect=[RuntimeError("db down"), RuntimeError("db down"), stats])
+
+        async def scenario():
+            ch = live._Channel(UserMetric(id=1, slug="sleep", name="sleep"))
+            sub = live._Subscriber("")
+            ch.subscribers.add(sub)
+            task = asyncio.ensure_future(ch.run())
+            try:
+                return await asyncio.wait_for(sub.queue.get(), timeout=5)
+            finally:
+                task.cancel()
+
+        with mock.patch.object(live, "_compute", compute), self.assertLogs("core.live", "ERROR"):
+            msg = asyncio.run(scenario())
+        self.assertEqual(msg["count"], 1)
+        self.assertEqual(compute.call_count, 3)
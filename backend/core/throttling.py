@@ -0,0 +1,147 @@
+"""
+Token-bucket throttle for submit endpoints.
+
+Rates come from ``REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]`` like DRF's
+built-in throttles ("N/period": bucket capacity N, refilled at N per
+period). Buckets live in the default Django cache, so limits are shared
+between workers only when CACHES points to a shared backend (Redis).
+DRF turns a rejection into 429 with ``Retry-After``. A request that costs
+more tokens than the smallest bucket holds could never pass, so it gets a
+400 stating the usable maximum instead.
+
+The per-user_hash, per-IP and global buckets are checked by one throttle,
+in that order, and tokens are taken only when every bucket can pay: a
+client rejected by its own bucket never drains the global one.
+"""
+from __future__ import annotations
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .models import UserValue
+
+THROTTLE_SCOPES = ("submit_user", "submit_ip", "submit_global")
+
+_DURATIONS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _count_key(scope: str) -> str:
+    return f"throttled_count_{scope}"
+
+
+def throttled_counts() -> Dict[str, int]:
+    counts = cache.get_many([_count_key(s) for s in THROTTLE_SCOPES])
+    return {s: int(counts.get(_count_key(s)) or 0) for s in THROTTLE_SCOPES}
+
+
+def _parse_rate(rate: Optional[str]) -> Optional[Tuple[int, int]]:
+    if not rate:
+        return None
+    num, period = rate.split("/")
+    return int(num), _DURATIONS[period[0]]
+
+
+class SubmitThrottle(BaseThrottle):
+    # get/set は原子的ではないので、同時アクセスではわずかに多く通ることがある（許容）
+    timer = time.time
+    cache_format = "throttle_%(scope)s_%(ident)s"
+
+    def cost(self, request) -> int:
+        """
+        1 リクエストで消費するトークン数
+        """
+        return 1
+
+    def _buckets(self, request) -> List[Tuple[str, str]]:
+        """
+        returns [(scope, cache_key)]。チェックする順（global は最後）
+        """
+        out = []
+        data = request.data
+        user_hash = data.get("user_hash") if hasattr(data, "get") else None
+        if user_hash:  # なければ 400 はビュー側で返す
+            out.append(("submit_user", str(user_hash)[:64]))
+        out.append(("submit_ip", self.get_ident(request)))
+        out.append(("submit_global", "all"))
+        return [(scope, self.cache_format % {"scope": scope, "ident": ident}) for scope, ident in out]
+
+    def allow_request(self, request, view):
+        self._wait = None
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        buckets = []
+        for scope, key in self._buckets(request):
+            rate = _parse_rate(rates.get(scope))
+            if rate is not None:
+                buckets.append((scope, key, rate))
+        if not buckets:
+            return True
+
+        cost = self.cost(request)
+        capacity = min(rate[0] for _, _, rate in buckets)
+        if cost > capacity:
+            # 何秒待っても通らないので 429 ではなく 400 で上限を伝える
+            raise ValidationError(
+                {"detail": f"too many new entries for the rate limit (max {capacity} per request)"}
+            )
+        now = self.timer()
+        state = cache.get_many([key for _, key, _ in buckets])
+
+        updated = {}
+        for scope, key, (capacity, duration) in buckets:
+            refill = capacity / duration  # tokens / sec
+            tokens, ts = state.get(key, (float(capacity), now))
+            tokens = min(float(capacity), tokens + max(0.0, now - ts) * refill)
+            if tokens < cost:
+                # ここで打ち切るので、後ろの（global を含む）バケツは消費しない
+                self._wait = (cost - tokens) / refill
+                self._count_throttled(scope)
+                return False
+            updated[key] = (tokens - cost, now, duration)
+
+        for key, (tokens, ts, duration) in updated.items():
+            cache.set(key, (tokens, ts), duration)
+        return True
+
+    def wait(self) -> Optional[float]:
+        return self._wait
+
+    def _count_throttled(self, scope: str) -> None:
+        key = _count_key(scope)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:  # add と incr の間で消えた場合
+            cache.set(key, 1, None)
+
+
+class BulkSubmitThrottle(SubmitThrottle):
+    """
+    一括送信は新しい entry の数ぶんのトークンを消費する（1 リクエストで上限をすり抜けさせない）。
+    登録済みの client_id は数えないので、応答を失った後の再送は 1 トークンで済む。
+    """
+
+    def cost(self, request) -> int:
+        data = request.data
+        entries = data.get("entries") if hasattr(data, "get") else None
+        if not isinstance(entries, list):
+            return 1
+        client_ids = set()
+        n_other = 0  # client_id のない entry（invalid になるが、数には入れる）
+        for entry in entries:
+            cid = entry.get("client_id") if isinstance(entry, dict) else None
+            if isinstance(cid, str) and cid:
+                client_ids.add(cid)
+            else:
+                n_other += 1
+        user_hash = data.get("user_hash")
+        if client_ids and user_hash:
+            client_ids -= set(
+                UserValue.objects.filter(user_hash=str(user_hash), client_id__in=list(client_ids))
+                .values_list("client_id", flat=True)
+            )
+        return max(1, len(client_ids) + n_other)
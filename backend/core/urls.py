@@ -5,17 +5,38 @@ urlpatterns = [
     # datasets
     path("datasets/", views.list_datasets),
     path("datasets/<slug:dataset_slug>/metrics/", views.list_dataset_metrics),
+    path("datasets/<slug:dataset_slug>/overview/", views.dataset_overview),
+    path("datasets/<slug:dataset_slug>/search/", views.search_dataset_items),
     path(
         "datasets/<slug:dataset_slug>/metrics/<slug:metric_key>/hensachi/",
         views.metric_hensachi,
     ),
+    path(
+        "datasets/<slug:dataset_slug>/metrics/<slug:metric_key>/hensachi/<str:x>/",
+        views.metric_value_hensachi,
+    ),
+    path(
+        "datasets/<slug:dataset_slug>/metrics/<slug:metric_key>/export/",
+        views.metric_export,
+    ),
 
     # user metrics
+    path("u/submit-bulk/", views.submit_user_values_bulk),
     path("u/<slug:user_metric_slug>/submit/", views.submit_user_value),
     path("u/<slug:user_metric_slug>/hensachi/<str:x>/", views.user_metric_hensachi),
     path("u/<slug:user_metric_slug>/history/", views.user_metric_history),
+    path("u/<slug:user_metric_slug>/stream/", views.user_metric_stream),
+    path("u/<slug:user_metric_slug>/export/", views.user_metric_export),
 
     # apex rank (rank-only hensachi)
     path("apex/rank/hensachi/<slug:rank_code>/", views.apex_rank_hensachi),
+
+    # rank distributions (any game / season)
+    path("ranks/<slug:game>/", views.rank_table),
+    path("ranks/<slug:game>/compare/", views.rank_compare),
+    path("ranks/<slug:game>/hensachi/<slug:rank_code>/", views.rank_hensachi),
+
+    # ops
+    path("ops/throttle/", views.throttle_stats),
 ]
 
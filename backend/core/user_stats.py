@@ -0,0 +1,230 @@
+"""
+UserMetric statistics over hot rows (UserValue) plus compacted months
+(UserValueRollup).
+
+``compact_month`` folds one calendar month of UserValue rows into per-user
+rollups and deletes the raw rows, so the hot table (and its indexes) only
+holds recent data. Stats are kept exact by combining count / sum / sum of
+squares from both tables.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import UserMetric, UserValue, UserValueRollup
+
+
+def effective_ts():
+    """
+    値の時刻: 一括送信で client_ts があればそれ、なければ受信時刻（履歴の並び・月の振り分けに使う）
+    """
+    return Coalesce("client_ts", "created_at")
+
+
+def compacted_until(um_ids: List[int]) -> Dict[int, datetime]:
+    """
+    user_metric_id -> 圧縮済みの最後の月の翌月初（これより前の時刻の値は受け付けない）
+    """
+    out = {}
+    for row in (
+        UserValueRollup.objects.filter(user_metric_id__in=um_ids)
+        .values("user_metric_id")
+        .annotate(last=Max("month"))
+    ):
+        out[row["user_metric_id"]] = _month_bounds(row["last"])[1]
+    return out
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def next_month(d: date) -> date:
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+def _month_bounds(month: date) -> Tuple[datetime, datetime]:
+    lo = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+    hi_d = next_month(month)
+    hi = datetime(hi_d.year, hi_d.month, 1, tzinfo=dt_timezone.utc)
+    return lo, hi
+
+
+def user_metric_stats(um: UserMetric) -> Tuple[int, Optional[Decimal], Optional[Decimal]]:
+    """
+    returns (count, mean, std) — std は母標準偏差（StdDev("value") と同じ）
+    """
+    hot = UserValue.objects.filter(user_metric=um).aggregate(
+        n=Count("id"),
+        s=Sum("value"),
+        sq=Sum(F("value") * F("value"), output_field=DecimalField()),
+    )
+    cold = UserValueRollup.objects.filter(user_metric=um).aggregate(
+        n=Sum("count"), s=Sum("total"), sq=Sum("total_sq")
+    )
+
+    n = (hot["n"] or 0) + (cold["n"] or 0)
+    if n == 0:
+        return 0, None, None
+
+    total = Decimal(hot["s"] or 0) + Decimal(cold["s"] or 0)
+    total_sq = Decimal(hot["sq"] or 0) + Decimal(cold["sq"] or 0)
+    mean = total / n
+    var = total_sq / n - mean * mean
+    if var < 0:  # 丸め誤差
+        var = Decimal("0")
+    return n, mean, var.sqrt()
+
+
+def user_history(um: UserMetric, user_hash: str, limit: int) -> List[dict]:
+    """
+    新しい順。生の行で足りなければ、圧縮済みの月の最終値で補う。
+    """
+    items = [
+        {
+            "id": row["id"],
+            "value": str(row["value"]),
+            "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+            "client_ts": row["client_ts"].isoformat() if row["client_ts"] else None,
+        }
+        for row in UserValue.objects.filter(user_metric=um, user_hash=user_hash)
+        .order_by(effective_ts().desc(), "-id")
+        .values("id", "value", "created_at", "client_ts")[:limit]
+    ]
+
+    rest = limit - len(items)
+    if rest > 0:
+        for row in (
+            UserValueRollup.objects.filter(user_metric=um, user_hash=user_hash)
+            .order_by("-month")
+            .values("last_id", "last_value", "last_created_at")[:rest]
+        ):
+            items.append(
+                {
+                    "id": row["last_id"],
+                    "value": str(row["last_value"]),
+                    "created_at": row["last_created_at"].isoformat(),
+                    "client_ts": None,
+                }
+            )
+    return items
+
+
+# IN 句のパラメータ数を抑える（SQLite の上限対策）
+DELETE_BATCH = 1000
+
+
+@transaction.atomic
+def compact_month(um: UserMetric, month: date) -> Tuple[int, int]:
+    """
+    um の month（月初日）分の UserValue を UserValueRollup に畳んで削除する。
+    returns (rows_compacted, rollups_written)
+    """
+    lo, hi = _month_bounds(month)
+    in_month = (
+        UserValue.objects.filter(user_metric=um)
+        .annotate(ts=effective_ts())
+        .filter(ts__gte=lo, ts__lt=hi)
+    )
+    rows = in_month.order_by("user_hash", "ts", "id").values_list("id", "user_hash", "value", "ts")
+
+    acc: Dict[str, dict] = {}
+    # 畳んだ行の id。削除はこれだけに限る（集計後にコミットされた同じ月の行を巻き込まない）
+    seen: List[int] = []
+    for pk, user_hash, value, created_at in rows.iterator(chunk_size=2000):
+        seen.append(pk)
+        a = acc.get(user_hash)
+        if a is None:
+            acc[user_hash] = {
+                "count": 1,
+                "total": value,
+                "total_sq": value * value,
+                "min_value": value,
+                "max_value": value,
+                "last_id": pk,
+                "last_value": value,
+                "last_created_at": created_at,
+            }
+            continue
+        a["count"] += 1
+        a["total"] += value
+        a["total_sq"] += value * value
+        a["min_value"] = min(a["min_value"], value)
+        a["max_value"] = max(a["max_value"], value)
+        a["last_id"], a["last_value"], a["last_created_at"] = pk, value, created_at
+
+    if not acc:
+        return 0, 0
+
+    # 既に同じ月の rollup があれば（再実行など）合算する
+    existing = {
+        r.user_hash: r
+        for r in UserValueRollup.objects.select_for_update().filter(
+            user_metric=um, month=month, user_hash__in=list(acc.keys())
+        )
+    }
+    to_create, to_update = [], []
+    for user_hash, a in acc.items():
+        r = existing.get(user_hash)
+        if r is None:
+            to_create.append(UserValueRollup(user_metric=um, user_hash=user_hash, month=month, **a))
+            continue
+        r.count += a["count"]
+        r.total += a["total"]
+        r.total_sq += a["total_sq"]
+        r.min_value = min(r.min_value, a["min_value"])
+        r.max_value = max(r.max_value, a["max_value"])
+        if a["last_created_at"] >= r.last_created_at:
+            r.last_id, r.last_value, r.last_created_at = (
+                a["last_id"], a["last_value"], a["last_created_at"]
+            )
+        to_update.append(r)
+
+    UserValueRollup.objects.bulk_create(to_create, batch_size=1000)
+    UserValueRollup.objects.bulk_update(
+        to_update,
+        ["count", "total", "total_sq", "min_value", "max_value",
+         "last_id", "last_value", "last_created_at"],
+        batch_size=1000,
+    )
+    for i in range(0, len(seen), DELETE_BATCH):
+        UserValue.objects.filter(pk__in=seen[i:i + DELETE_BATCH]).delete()
+    return len(seen), len(acc)
+
+
+def latest_values(um: UserMetric, user_hashes: List[str]) -> Dict[str, Decimal]:
+    """
+    user_hash ごとの最新値をまとめて引く（人数によらずクエリ 2 本）
+    """
+    if not user_hashes:
+        return {}
+
+    newest = (
+        UserValue.objects.filter(user_metric=um, user_hash=OuterRef("user_hash"))
+        .order_by(effective_ts().desc(), "-id")
+        .values("id")[:1]
+    )
+    out = dict(
+        UserValue.objects.filter(user_metric=um, user_hash__in=user_hashes, id=Subquery(newest))
+        .values_list("user_hash", "value")
+    )
+
+    missing = [h for h in user_hashes if h not in out]
+    if missing:
+        newest_month = (
+            UserValueRollup.objects.filter(user_metric=um, user_hash=OuterRef("user_hash"))
+            .order_by("-month")
+            .values("id")[:1]
+        )
+        out.update(
+            UserValueRollup.objects.filter(
+                user_metric=um, user_hash__in=missing, id=Subquery(newest_month)
+            ).values_list("user_hash", "last_value")
+        )
+    return out
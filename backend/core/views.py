@@ -1,18 +1,33 @@
 from __future__ import annotations
 
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal, InvalidOperation
-from math import log, sqrt
-from typing import Dict, Tuple
-
-from django.db.models import Avg, StdDev
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import router
+from django.db.models import Avg, Case, Count, DecimalField, F, Max, Min, StdDev, When, Window
+from django.db.models.functions import RowNumber
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 
+from . import export, metric_cache, ranks
+from .search import search_items
+from .db_routing import pin_user
 from .models import Dataset, Metric, Item, Value, UserMetric, UserValue
-from .serializers import DatasetSerializer
+from .serializers import BulkUserValueEntrySerializer, DatasetSerializer
+from .signals import notify_live_stats_changed
+from .throttling import BulkSubmitThrottle, SubmitThrottle, throttled_counts
+from .user_stats import compacted_until, user_history, user_metric_stats
 
 
 # ----------------------------
@@ -26,166 +41,135 @@ def hensachi(x: Decimal, mean: Decimal, std: Decimal) -> Decimal:
 
 
 # ----------------------------
-# Apex rank -> hensachi (rank-only)
-# Source: EsportsTales "Top percentage of players" table (Dec 2025 Season 27),
-# based on Apex Legends Status data.
-# https://www.esportstales.com/apex-legends/rank-distribution-and-percentage-of-players-by-tier
+# Rank distribution -> hensachi (rank-only)
+# テーブルは RankDistribution / RankTier（manage.py import_rank_distribution で投入）。
+# 偏差値は取り込み時に計算済みなので、ここではキャッシュを引くだけ。
 # ----------------------------
 
-# rank_code format we accept:
-#   rookie-4 ... rookie-1
-#   bronze-4 ... bronze-1
-#   silver-4 ... silver-1
-#   gold-4   ... gold-1
-#   platinum-4 ... platinum-1
-#   diamond-4 ... diamond-1
-#   master
-#   predator
-#
-# Value is "Top %": e.g. Bronze IV => 98.55 means "top 98.55% (i.e. only bottom 1.45% below you)"
-APEX_RANK_TOP_PERCENT: Dict[str, Decimal] = {
-    "rookie-4": Decimal("99.98"),
-    "rookie-3": Decimal("99.67"),
-    "rookie-2": Decimal("99.66"),
-    "rookie-1": Decimal("99.65"),
-
-    "bronze-4": Decimal("98.55"),
-    "bronze-3": Decimal("94.92"),
-    "bronze-2": Decimal("93.57"),
-    "bronze-1": Decimal("91.96"),
-
-    "silver-4": Decimal("90.53"),
-    "silver-3": Decimal("83.55"),
-    "silver-2": Decimal("79.75"),
-    "silver-1": Decimal("77.18"),
-
-    "gold-4": Decimal("74.78"),
-    "gold-3": Decimal("63.76"),
-    "gold-2": Decimal("57.55"),
-    "gold-1": Decimal("53.65"),
-
-    "platinum-4": Decimal("50.66"),
-    "platinum-3": Decimal("38.47"),
-    "platinum-2": Decimal("23.48"),
-    "platinum-1": Decimal("15.57"),
-
-    "diamond-4": Decimal("10.37"),
-    "diamond-3": Decimal("5.68"),
-    "diamond-2": Decimal("1.89"),
-    "diamond-1": Decimal("0.73"),
-
-    "master": Decimal("0.25"),
-    "predator": Decimal("0.24"),
-}
-
-APEX_RANK_META = {
-    "season": "27",
-    "asof": "Dec 2025",
-    "source_name": "EsportsTales (compiled from Apex Legends Status)",
-}
+APEX_GAME = "apex-legends"
 
 
-def _inv_norm_cdf(p: float) -> float:
-    """
-    Inverse CDF for standard normal distribution.
-    Peter J. Acklam's approximation (commonly used, good accuracy for UI/stats).
-    p must be in (0,1).
-    """
-    # Coefficients in rational approximations.
-    a = [-3.969683028665376e+01,
-         2.209460984245205e+02,
-         -2.759285104469687e+02,
-         1.383577518672690e+02,
-         -3.066479806614716e+01,
-         2.506628277459239e+00]
-
-    b = [-5.447609879822406e+01,
-         1.615858368580409e+02,
-         -1.556989798598866e+02,
-         6.680131188771972e+01,
-         -1.328068155288572e+01]
-
-    c = [-7.784894002430293e-03,
-         -3.223964580411365e-01,
-         -2.400758277161838e+00,
-         -2.549732539343734e+00,
-         4.374664141464968e+00,
-         2.938163982698783e+00]
-
-    d = [7.784695709041462e-03,
-         3.224671290700398e-01,
-         2.445134137142996e+00,
-         3.754408661907416e+00]
-
-    # Define break-points.
-    plow = 0.02425
-    phigh = 1 - plow
-
-    if p <= 0.0 or p >= 1.0:
-        raise ValueError("p must be in (0,1)")
-
-    if p < plow:
-        q = sqrt(-2 * log(p))
-        return (((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / \
-               ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
-    if p > phigh:
-        q = sqrt(-2 * log(1 - p))
-        return -(((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / \
-                ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
-
-    q = p - 0.5
-    r = q*q
-    return (((((a[0]*r + a[1])*r + a[2])*r + a[3])*r + a[4])*r + a[5]) * q / \
-           (((((b[0]*r + b[1])*r + b[2])*r + b[3])*r + b[4])*r + 1)
-
-
-def _hensachi_from_top_percent(top_percent: Decimal) -> Tuple[Decimal, Decimal]:
-    """
-    top_percent: e.g. 23.48 means top 23.48%
-    returns (hensachi, cdf_percent)
-    """
-    # cdf = bottom% = 100 - top%
-    cdf_percent = Decimal("100") - top_percent
-
-    # clamp to avoid p=0 or p=1
-    p = float(cdf_percent / Decimal("100"))
-    eps = 1e-9
-    if p <= 0:
-        p = eps
-    if p >= 1:
-        p = 1 - eps
+def _rank_not_found(game: str, season: Optional[str]):
+    return Response(
+        {
+            "detail": "unknown game/season",
+            "game": game,
+            "season": season,
+            "seasons": ranks.seasons(game),
+        },
+        status=status.HTTP_404_NOT_FOUND,
+    )
 
-    z = _inv_norm_cdf(p)
-    h = Decimal("50") + Decimal("10") * Decimal(str(z))
-    return h, cdf_percent
 
+def _rank_hensachi_response(game: str, rank_code: str, season: Optional[str]):
+    table = ranks.get_table(game, season)
+    if table is None:
+        return _rank_not_found(game, season)
 
-@api_view(["GET"])
-def apex_rank_hensachi(request, rank_code: str):
     rank_code = (rank_code or "").strip().lower()
-    top = APEX_RANK_TOP_PERCENT.get(rank_code)
-    if top is None:
+    tier = table["tiers"].get(rank_code)
+    if tier is None:
         return Response(
             {
                 "detail": "unknown rank_code",
                 "hint": "examples: gold-2, platinum-4, diamond-1, master, predator",
                 "rank_code": rank_code,
-                "allowed": sorted(APEX_RANK_TOP_PERCENT.keys()),
+                "allowed": sorted(table["tiers"].keys()),
             },
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    h, cdf_percent = _hensachi_from_top_percent(top)
-
     return Response(
         {
-            "game": "apex-legends",
+            "game": game,
             "metric": "rank",
             "rank_code": rank_code,
-            "top_percent": str(top),         # e.g. "23.48"
-            "bottom_percent": str(cdf_percent),  # e.g. "76.52"
-            "hensachi": str(h),
-            "meta": APEX_RANK_META,
+            "top_percent": tier["top_percent"],        # e.g. "23.48"
+            "bottom_percent": tier["bottom_percent"],  # e.g. "76.52"
+            "hensachi": tier["hensachi"],
+            "meta": table["meta"],
+        }
+    )
+
+
+@api_view(["GET"])
+def apex_rank_hensachi(request, rank_code: str):
+    return _rank_hensachi_response(APEX_GAME, rank_code, request.query_params.get("season"))
+
+
+@api_view(["GET"])
+def rank_hensachi(request, game: str, rank_code: str):
+    """
+    GET /api/ranks/<game>/hensachi/<rank_code>/?season=27
+    """
+    return _rank_hensachi_response(game, rank_code, request.query_params.get("season"))
+
+
+@api_view(["GET"])
+def rank_table(request, game: str):
+    """
+    GET /api/ranks/<game>/?season=27
+    tier 全件（下位 -> 上位の順）を 1 レスポンスで返す
+    """
+    season = request.query_params.get("season")
+    table = ranks.get_table(game, season)
+    if table is None:
+        return _rank_not_found(game, season)
+
+    return Response(
+        {
+            "game": game,
+            "season": table["season"],
+            "seasons": ranks.seasons(game),
+            "meta": table["meta"],
+            "tiers": [table["tiers"][code] for code in table["order"]],
+        }
+    )
+
+
+@api_view(["GET"])
+def rank_compare(request, game: str):
+    """
+    GET /api/ranks/<game>/compare/?seasons=26,27
+    seasons 省略時は全シーズン。tier ごとにシーズン別の値を並べる
+    """
+    raw = request.query_params.get("seasons") or ""
+    wanted = [x.strip() for x in raw.split(",") if x.strip()] or ranks.seasons(game)
+    if not wanted:
+        return _rank_not_found(game, None)
+
+    tables = []
+    for season in wanted:
+        table = ranks.get_table(game, season)
+        if table is None:
+            return _rank_not_found(game, season)
+        tables.append(table)
+
+    # tier の並びは最初に見つかったシーズン順、後のシーズンにしかない tier は末尾に追加
+    codes: List[str] = []
+    for table in tables:
+        for code in table["order"]:
+            if code not in codes:
+                codes.append(code)
+
+    rows = []
+    for code in codes:
+        by_season = {}
+        for table in tables:
+            tier = table["tiers"].get(code)
+            by_season[table["season"]] = (
+                None
+                if tier is None
+                else {k: tier[k] for k in ("top_percent", "bottom_percent", "hensachi")}
+            )
+        rows.append({"rank_code": code, "seasons": by_season})
+
+    return Response(
+        {
+            "game": game,
+            "seasons": [t["season"] for t in tables],
+            "meta": {t["season"]: t["meta"] for t in tables},
+            "tiers": rows,
         }
     )
 
@@ -208,35 +192,167 @@ def list_dataset_metrics(request, dataset_slug: str):
 
 
 @api_view(["GET"])
-def metric_hensachi(request, dataset_slug: str, metric_key: str):
-    try:
-        ds = Dataset.objects.get(slug=dataset_slug)
-        metric = Metric.objects.get(dataset=ds, key=metric_key)
-    except (Dataset.DoesNotExist, Metric.DoesNotExist):
-        return Response({"detail": "not found"}, status=status.HTTP_404_NOT_FOUND)
+def dataset_overview(request, dataset_slug: str):
+    """
+    GET /api/datasets/<slug>/overview/?top=5
+    全 Metric の count/mean/std/min/max と上位 top 件を、metric 数によらず固定 3 クエリで返す
+    """
+    ds = get_object_or_404(Dataset, slug=dataset_slug)
 
-    vals = Value.objects.filter(metric=metric).select_related("item")
-    agg = vals.aggregate(mean=Avg("value"), std=StdDev("value"))
-    mean = agg["mean"]
-    std = agg["std"]
+    try:
+        top = int(request.query_params.get("top") or "5")
+    except ValueError:
+        top = 5
+    top = max(0, min(top, 50))
+
+    metrics = list(
+        Metric.objects.filter(dataset=ds)
+        .order_by("key")
+        .annotate(
+            count=Count("values"),
+            mean=Avg("values__value"),
+            std=StdDev("values__value"),
+            min=Min("values__value"),
+            max=Max("values__value"),
+        )
+    )
 
-    if mean is None or std is None:
-        return Response({"detail": "no data"}, status=status.HTTP_400_BAD_REQUEST)
+    top_by_metric = {m.id: [] for m in metrics}
+    if top and metrics:
+        # higher_is_better=False の metric は小さい順を「上位」とする
+        score = Case(
+            When(metric__higher_is_better=True, then=F("value")),
+            default=-F("value"),
+            output_field=DecimalField(),
+        )
+        rows = (
+            Value.objects.filter(metric__dataset=ds)
+            .annotate(
+                pos=Window(RowNumber(), partition_by=[F("metric_id")], order_by=[score.desc(), F("id").asc()])
+            )
+            .filter(pos__lte=top)
+            .order_by("metric_id", "pos")
+            .values("metric_id", "pos", "value", "item__key", "item__name")
+        )
+        for r in rows:
+            top_by_metric[r["metric_id"]].append(r)
 
     out = []
-    for v in vals:
+    for m in metrics:
+        items = []
+        for r in top_by_metric[m.id]:
+            items.append(
+                {
+                    "rank": r["pos"],
+                    "item": {"key": r["item__key"], "name": r["item__name"]},
+                    "value": str(r["value"]),
+                    "hensachi": str(hensachi(r["value"], m.mean, m.std)),
+                }
+            )
         out.append(
             {
-                "item": {"key": v.item.key, "name": v.item.name, "meta": v.item.meta},
-                "value": str(v.value),
-                "hensachi": str(hensachi(v.value, mean, std)),
+                "key": m.key,
+                "name": m.name,
+                "unit": m.unit,
+                "higher_is_better": m.higher_is_better,
+                "count": m.count,
+                "mean": None if m.mean is None else str(m.mean),
+                "std": None if m.std is None else str(m.std),
+                "min": None if m.min is None else str(m.min),
+                "max": None if m.max is None else str(m.max),
+                "top": items,
             }
         )
 
-    out.sort(key=lambda d: Decimal(d["hensachi"]), reverse=True)
+    return Response({"dataset": ds.slug, "name": ds.name, "top": top, "metrics": out})
+
+
+@api_view(["GET"])
+def search_dataset_items(request, dataset_slug: str):
+    """
+    GET /api/datasets/<slug>/search/?q=富士&metric=height_m&limit=20
+    name / key で Item を探し、metric 指定時は値・偏差値・順位も返す
+    """
+    ds = get_object_or_404(Dataset, slug=dataset_slug)
+
+    q = (request.query_params.get("q") or "").strip()
+    if not q:
+        return Response({"detail": "q required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = int(request.query_params.get("limit") or "20")
+    except ValueError:
+        limit = 20
+    limit = max(1, min(limit, 50))
+
+    metric = None
+    snap = None
+    metric_key = request.query_params.get("metric")
+    if metric_key:
+        try:
+            metric = Metric.objects.get(dataset=ds, key=metric_key)
+        except Metric.DoesNotExist:
+            return Response({"detail": "metric not found"}, status=status.HTTP_404_NOT_FOUND)
+        metric_cache.record_hit(metric.id)
+        snap = metric_cache.get_snapshot(metric)
+
+    results = []
+    for item in search_items(ds, q, limit):
+        row = {"key": item.key, "name": item.name, "meta": item.meta}
+        if metric is not None:
+            # 値はキャッシュ済みスナップショットから引く（追加クエリなし）
+            v = snap.by_key.get(item.key)
+            row["value"] = None if v is None else str(v)
+            row["hensachi"] = None
+            row["rank"] = None
+            if v is not None and snap.mean is not None:
+                row["hensachi"] = str(hensachi(v, snap.mean, snap.std))
+                better = snap.count_above(v) if metric.higher_is_better else snap.count_below(v)
+                row["rank"] = better + 1
+        results.append(row)
+
     return Response(
         {
             "dataset": ds.slug,
+            "q": q,
+            "metric": metric.key if metric is not None else None,
+            "unit": metric.unit if metric is not None else None,
+            "count": len(results),
+            "results": results,
+        }
+    )
+
+
+@api_view(["GET"])
+def metric_hensachi(request, dataset_slug: str, metric_key: str):
+    """
+    GET /api/datasets/<slug>/metrics/<key>/hensachi/
+    全 Item の偏差値（高い順）。値・平均・標準偏差はキャッシュ済みスナップショットから引く
+    """
+    try:
+        metric = Metric.objects.select_related("dataset").get(
+            dataset__slug=dataset_slug, key=metric_key
+        )
+    except Metric.DoesNotExist:
+        return Response({"detail": "not found"}, status=status.HTTP_404_NOT_FOUND)
+    metric_cache.record_hit(metric.id)
+
+    snap = metric_cache.get_snapshot(metric)
+    mean, std = snap.mean, snap.std
+    if mean is None:
+        return Response({"detail": "no data"}, status=status.HTTP_400_BAD_REQUEST)
+
+    out = [
+        {
+            "item": {"key": key, "name": name, "meta": meta},
+            "value": str(v),
+            "hensachi": str(hensachi(v, mean, std)),
+        }
+        for v, key, name, meta in snap.descending()
+    ]
+    return Response(
+        {
+            "dataset": metric.dataset.slug,
             "metric": metric.key,
             "unit": metric.unit,
             "count": len(out),
@@ -247,7 +363,65 @@ def metric_hensachi(request, dataset_slug: str, metric_key: str):
     )
 
 
+@api_view(["GET"])
+def metric_value_hensachi(request, dataset_slug: str, metric_key: str, x: str):
+    """
+    GET /api/datasets/<slug>/metrics/<key>/hensachi/<x>/?neighbors=1
+    "x だったら何位？" を、キャッシュ済みのソート配列に対する bisect で答える
+    """
+    try:
+        metric = Metric.objects.select_related("dataset").get(
+            dataset__slug=dataset_slug, key=metric_key
+        )
+    except Metric.DoesNotExist:
+        return Response({"detail": "not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        dx = Decimal(x)
+    except InvalidOperation:
+        return Response({"detail": "x must be number"}, status=status.HTTP_400_BAD_REQUEST)
+    if not dx.is_finite():
+        return Response({"detail": "x must be number"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        k = int(request.query_params.get("neighbors") or "1")
+    except ValueError:
+        k = 1
+    k = max(0, min(k, 10))
+
+    metric_cache.record_hit(metric.id)
+    snap = metric_cache.get_snapshot(metric)
+    if snap.mean is None or snap.std is None:
+        return Response({"detail": "no data"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if metric.higher_is_better:
+        better = snap.count_above(dx)
+    else:
+        better = snap.count_below(dx)
+    rank = better + 1
+    above, below = snap.neighbors(dx, k)
+
+    return Response(
+        {
+            "dataset": metric.dataset.slug,
+            "metric": metric.key,
+            "unit": metric.unit,
+            "x": str(dx),
+            "hensachi": str(hensachi(dx, snap.mean, snap.std)),
+            "rank": rank,
+            # x 自身を母集団に加えた n+1 人中の順位として上位%を出す
+            "top_percent": str(round(Decimal(rank) * 100 / Decimal(snap.count + 1), 2)),
+            "count": snap.count,
+            "mean": str(snap.mean),
+            "std": str(snap.std),
+            "above": above,
+            "below": below,
+        }
+    )
+
+
 @api_view(["POST"])
+@throttle_classes([SubmitThrottle])
 def submit_user_value(request, user_metric_slug: str):
     try:
         um = UserMetric.objects.get(slug=user_metric_slug)
@@ -260,9 +434,100 @@ def submit_user_value(request, user_metric_slug: str):
         return Response({"detail": "user_hash and value required"}, status=status.HTTP_400_BAD_REQUEST)
 
     UserValue.objects.create(user_metric=um, user_hash=user_hash, value=value)
+    pin_user(user_hash)
     return Response({"detail": "ok"}, status=status.HTTP_201_CREATED)
 
 
+# 端末時計のずれとして許容する幅
+CLIENT_TS_MAX_SKEW = timedelta(minutes=5)
+
+
+@api_view(["POST"])
+@throttle_classes([BulkSubmitThrottle])
+def submit_user_values_bulk(request):
+    """
+    POST /api/u/submit-bulk/
+    {"user_hash": "...", "entries": [{"user_metric": "sleep", "value": 7.5,
+                                      "client_id": "<uuid>", "client_ts": "2026-01-01T07:00:00Z"}, ...]}
+    client_id が既に登録済みのものは duplicate として無視する（再送しても重複しない）。
+    不正な entry は invalid として返し、残りは 1 回の bulk_create で登録する。
+    """
+    user_hash = request.data.get("user_hash")
+    entries = request.data.get("entries")
+    if not user_hash or not isinstance(entries, list):
+        return Response({"detail": "user_hash and entries required"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(entries) > settings.BULK_SUBMIT_MAX:
+        return Response(
+            {"detail": f"too many entries (max {settings.BULK_SUBMIT_MAX})"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    results = [None] * len(entries)
+    valid = {}  # client_id -> (index, validated data)
+    for i, entry in enumerate(entries):
+        ser = BulkUserValueEntrySerializer(data=entry if isinstance(entry, dict) else {})
+        if not ser.is_valid():
+            results[i] = {"status": "invalid", "errors": ser.errors}
+            continue
+        data = ser.validated_data
+        cid = data["client_id"]
+        if cid in valid:
+            results[i] = {"client_id": cid, "status": "duplicate"}
+            continue
+        valid[cid] = (i, data)
+
+    slugs = {data["user_metric"] for _, data in valid.values()}
+    ums = {um.slug: um for um in UserMetric.objects.filter(slug__in=slugs)}
+    existing = set(
+        UserValue.objects.filter(user_hash=user_hash, client_id__in=list(valid.keys()))
+        .values_list("client_id", flat=True)
+    )
+
+    # 未来の時刻と、圧縮済み（compact_user_values）の月に入る時刻は受け付けない
+    latest_ok = timezone.now() + CLIENT_TS_MAX_SKEW
+    earliest_ok = compacted_until([um.id for um in ums.values()])
+
+    to_create = []
+    for cid, (i, data) in valid.items():
+        um = ums.get(data["user_metric"])
+        ts = data.get("client_ts")
+        if um is None:
+            results[i] = {"client_id": cid, "status": "invalid", "errors": {"user_metric": ["not found"]}}
+        elif ts is not None and ts > latest_ok:
+            results[i] = {"client_id": cid, "status": "invalid", "errors": {"client_ts": ["in the future"]}}
+        elif ts is not None and um.id in earliest_ok and ts < earliest_ok[um.id]:
+            results[i] = {
+                "client_id": cid,
+                "status": "invalid",
+                "errors": {"client_ts": [f"before {earliest_ok[um.id].isoformat()} (already compacted)"]},
+            }
+        elif cid in existing:
+            results[i] = {"client_id": cid, "status": "duplicate"}
+        else:
+            results[i] = {"client_id": cid, "status": "created"}
+            to_create.append(
+                UserValue(
+                    user_metric=um,
+                    user_hash=user_hash,
+                    value=data["value"],
+                    client_id=cid,
+                    client_ts=data.get("client_ts"),
+                )
+            )
+
+    # 同時に同じ client_id が送られた場合も、制約違反は無視して重複させない
+    UserValue.objects.bulk_create(to_create, ignore_conflicts=True)
+    if to_create:
+        pin_user(user_hash)
+        for um_id in {uv.user_metric_id for uv in to_create}:
+            notify_live_stats_changed(um_id)
+
+    counts = {"created": 0, "duplicate": 0, "invalid": 0}
+    for r in results:
+        counts[r["status"]] += 1
+    return Response({"user_hash": user_hash, **counts, "results": results})
+
+
 @api_view(["GET"])
 def user_metric_hensachi(request, user_metric_slug: str, x: str):
     try:
@@ -270,10 +535,7 @@ def user_metric_hensachi(request, user_metric_slug: str, x: str):
     except UserMetric.DoesNotExist:
         return Response({"detail": "not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    qs = UserValue.objects.filter(user_metric=um)
-    agg = qs.aggregate(mean=Avg("value"), std=StdDev("value"))
-    mean = agg["mean"]
-    std = agg["std"]
+    count, mean, std = user_metric_stats(um)
     if mean is None or std is None:
         return Response({"detail": "no data yet"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -290,7 +552,7 @@ def user_metric_hensachi(request, user_metric_slug: str, x: str):
             "hensachi": str(hx),
             "mean": str(mean),
             "std": str(std),
-            "count": qs.count(),
+            "count": count,
             "unit": um.unit,
         }
     )
@@ -316,21 +578,189 @@ def user_metric_history(request, user_metric_slug: str):
         limit = 10
     limit = max(1, min(limit, 100))
 
-    qs = (
-        UserValue.objects.filter(user_metric=um, user_hash=user_hash)
-        .order_by("-created_at")
-        .values("id", "value", "created_at")
-    )[:limit]
+    items = user_history(um, user_hash, limit)
 
-    items = []
-    for row in qs:
-        items.append(
-            {
-                "id": row["id"],
-                "value": str(row["value"]),
-                "created_at": row["created_at"].isoformat() if row["created_at"] else None,
-            }
+    return Response({"user_metric": um.slug, "user_hash": user_hash, "limit": limit, "items": items})
+
+
+@api_view(["GET"])
+def throttle_stats(request):
+    """
+    GET /api/ops/throttle/
+    scope ごとの 429 件数（キャッシュが共有でなければプロセス単位）
+    """
+    return Response({"throttled": throttled_counts()})
+
+
+SSE_HEARTBEAT_SECONDS = 15
+
+
+async def user_metric_stream(request, user_metric_slug: str):
+    """
+    GET /api/u/<slug>/stream/?user_hash=...
+    Server-Sent Events で count/mean/std（user_hash があれば最新値の偏差値も）を配信する。
+    ASGI（uvicorn など）で動かすこと。WSGI では終わらないストリームを丸ごとバッファして
+    ワーカーが戻らなくなるので 501 を返す。
+    """
+    from . import live  # live は views.hensachi を使うので遅延 import
+
+    if request.method != "GET":
+        return JsonResponse({"detail": "method not allowed"}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"detail": "streaming requires an ASGI server (gunicorn -k uvicorn.workers.UvicornWorker)"},
+            status=501,
         )
 
-    return Response({"user_metric": um.slug, "user_hash": user_hash, "limit": limit, "items": items})
+    try:
+        um = await UserMetric.objects.aget(slug=user_metric_slug)
+    except UserMetric.DoesNotExist:
+        return JsonResponse({"detail": "not found"}, status=404)
+
+    user_hash = request.GET.get("user_hash") or ""
+
+    async def events():
+        sub = live.subscribe(um, user_hash)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    msg = await asyncio.wait_for(sub.queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: stats\ndata: {json.dumps(msg)}\n\n"
+        finally:
+            live.unsubscribe(um, sub)
+
+    resp = StreamingHttpResponse(events(), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
+
+
+# ----------------------------
+# Export (streaming)
+# DRF の ?format= と衝突しないよう素の Django ビューにしている
+# ----------------------------
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
 
+
+def _parse_since(raw: str):
+    """
+    "2026-01-01" / "2026-01-01T09:00:00+09:00" を受け付ける。不正なら ValueError
+    """
+    dt = parse_datetime(raw)
+    if dt is None:
+        d = parse_date(raw)
+        if d is None:
+            raise ValueError(raw)
+        dt = datetime(d.year, d.month, d.day)
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, dt_timezone.utc)
+    return dt
+
+
+def _export_response(request, filename: str, header, make_rows):
+    """
+    make_rows(since) -> iterable of rows
+    """
+    if request.method != "GET":
+        return JsonResponse({"detail": "method not allowed"}, status=405)
+
+    fmt = (request.GET.get("format") or "csv").lower()
+    if fmt not in EXPORT_CONTENT_TYPES:
+        return JsonResponse({"detail": "format must be csv or ndjson"}, status=400)
+
+    since = None
+    if request.GET.get("since"):
+        try:
+            since = _parse_since(request.GET["since"])
+        except ValueError:
+            return JsonResponse({"detail": "since must be ISO date/datetime"}, status=400)
+
+    use_gzip = request.GET.get("gzip") == "1"
+    resp = StreamingHttpResponse(
+        export.stream(fmt, header, make_rows(since), gzip=use_gzip),
+        content_type=EXPORT_CONTENT_TYPES[fmt],
+    )
+    resp["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    if use_gzip:
+        resp["Content-Encoding"] = "gzip"
+    return resp
+
+
+def user_metric_export(request, user_metric_slug: str):
+    """
+    GET /api/u/<slug>/export/?format=csv|ndjson&since=...&gzip=1
+    圧縮済み（compact_user_values）の月は含まない。since は受信時刻（created_at）で絞る。
+    user_hash は出さず、UserMetric ごとの固定の仮名に置き換える（差分取得どうしで突き合わせられる）
+    """
+    try:
+        um = UserMetric.objects.get(slug=user_metric_slug)
+    except UserMetric.DoesNotExist:
+        return JsonResponse({"detail": "not found"}, status=404)
+    if um.privacy != "public":
+        return JsonResponse({"detail": "forbidden"}, status=403)
+
+    # ストリームはミドルウェアを抜けた後に読まれるので、ここで読み取り先 DB を固定する
+    db = router.db_for_read(UserValue)
+
+    pseudonym = export.pseudonymizer(um.slug)
+
+    def rows(since):
+        qs = UserValue.objects.using(db).filter(user_metric=um)
+        if since is not None:
+            qs = qs.filter(created_at__gte=since)
+        for pk, user_hash, value, created_at, client_ts in (
+            qs.order_by("id")
+            .values_list("id", "user_hash", "value", "created_at", "client_ts")
+            .iterator(chunk_size=export.CHUNK_SIZE)
+        ):
+            yield (
+                pk,
+                pseudonym(user_hash),
+                str(value),
+                created_at.isoformat(),
+                client_ts.isoformat() if client_ts else None,
+            )
+
+    return _export_response(
+        request, um.slug, ["id", "user", "value", "created_at", "client_ts"], rows
+    )
+
+
+def metric_export(request, dataset_slug: str, metric_key: str):
+    """
+    GET /api/datasets/<slug>/metrics/<key>/export/?format=csv|ndjson&since=...&gzip=1
+    """
+    try:
+        metric = Metric.objects.select_related("dataset").get(
+            dataset__slug=dataset_slug, key=metric_key
+        )
+    except Metric.DoesNotExist:
+        return JsonResponse({"detail": "not found"}, status=404)
+
+    db = router.db_for_read(Value)
+
+    def rows(since):
+        qs = Value.objects.using(db).filter(metric=metric)
+        if since is not None:
+            qs = qs.filter(updated_at__gte=since)
+        for key, name, value, source, updated_at in (
+            qs.order_by("id")
+            .values_list("item__key", "item__name", "value", "source", "updated_at")
+            .iterator(chunk_size=export.CHUNK_SIZE)
+        ):
+            yield key, name, str(value), source, updated_at.isoformat()
+
+    return _export_response(
+        request,
+        f"{metric.dataset.slug}-{metric.key}",
+        ["item_key", "item_name", "value", "source", "updated_at"],
+        rows,
+    )
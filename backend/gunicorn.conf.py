@@ -0,0 +1,54 @@
+"""
+gunicorn settings (picked up automatically when started from backend/).
+
+    gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker
+    gunicorn config.wsgi:application  # SSE を使わない場合（stream は 501 を返す）
+
+The app is imported once in the master (preload_app), caches are warmed
+there, and DB connections are closed before fork so each worker opens its
+own. gc.freeze() keeps the warmed objects out of later GC passes, which
+would otherwise touch (and un-share) their pages.
+"""
+import gc
+import os
+import time
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+_t0 = time.perf_counter()
+
+
+def when_ready(server):
+    # preload_app なら、ここに来た時点で Django の import / setup は済んでいる
+    server.log.info("app import + setup: %.3fs", time.perf_counter() - _t0)
+    if not preload_app or os.getenv("WARMUP", "1") != "1":
+        return
+
+    from django.db import connections
+
+    from core.warmup import warm_up
+
+    try:
+        timings = warm_up()
+        server.log.info(
+            "warm-up: %s", ", ".join(f"{k}={v:.3f}s" for k, v in timings.items())
+        )
+    except Exception:
+        # DB 未準備（初回 migrate 前など）でも起動は続ける
+        server.log.exception("warm-up failed")
+    finally:
+        # ソケットを fork 先と共有しないよう、master の接続は閉じておく
+        connections.close_all()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from django.db import connection
+
+    t = time.perf_counter()
+    try:
+        connection.ensure_connection()
+    except Exception:
+        server.log.exception("worker %s: db connect failed", worker.pid)
+        return
+    server.log.debug("worker %s: db connect %.3fs", worker.pid, time.perf_counter() - t)
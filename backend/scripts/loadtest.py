@@ -0,0 +1,203 @@
+"""
+Mixed-workload load test against a running API.
+
+    # 別ターミナルでサーバを起動（レート制限は外しておく）
+    THROTTLE_SUBMIT_USER= THROTTLE_SUBMIT_IP= THROTTLE_SUBMIT_GLOBAL= \
+        gunicorn config.wsgi:application -w 4 -b 127.0.0.1:8000
+    # または: uvicorn config.asgi:application --workers 4 --port 8000
+
+    python scripts/loadtest.py --base-url http://127.0.0.1:8000/api \
+        --user-metric sleep --dataset japan-mountains --metric height_m \
+        --rps 200 --duration 60 --users 1000 \
+        --mix submit=3,hensachi=4,history=2,ranking=1 \
+        --db-url "$DATABASE_URL"
+
+Requests are scheduled open-loop at --rps (latency is measured from the
+scheduled time, so a stalled server shows up as latency rather than as a
+lower send rate). With --db-url (Postgres), pg_stat_activity is sampled
+once a second to report sessions waiting on locks.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+OPS = ("submit", "hensachi", "history", "ranking")
+
+
+def parse_mix(s):
+    mix = {}
+    for part in s.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPS:
+            raise SystemExit(f"unknown op in --mix: {name} (choose from {', '.join(OPS)})")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise SystemExit("--mix must have at least one positive weight")
+    return mix
+
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)  # op -> [sec]
+        self.errors = defaultdict(int)  # op -> count
+        self.status = defaultdict(int)  # (op, status) -> count
+
+    def record(self, op, status, latency, ok):
+        with self.lock:
+            self.latency[op].append(latency)
+            self.status[(op, status)] += 1
+            if not ok:
+                self.errors[op] += 1
+
+
+class Client:
+    def __init__(self, args):
+        self.args = args
+        self.users = [f"load-{i:06d}" for i in range(args.users)]
+
+    def request(self, op):
+        a = self.args
+        user_hash = random.choice(self.users)
+        if op == "submit":
+            body = json.dumps({"user_hash": user_hash, "value": round(random.gauss(a.mean, a.std), 2)})
+            return urllib.request.Request(
+                f"{a.base_url}/u/{a.user_metric}/submit/",
+                data=body.encode(),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+        if op == "hensachi":
+            x = round(random.gauss(a.mean, a.std), 2)
+            return urllib.request.Request(f"{a.base_url}/u/{a.user_metric}/hensachi/{x}/")
+        if op == "history":
+            return urllib.request.Request(
+                f"{a.base_url}/u/{a.user_metric}/history/?user_hash={user_hash}&limit=10"
+            )
+        return urllib.request.Request(f"{a.base_url}/datasets/{a.dataset}/metrics/{a.metric}/hensachi/")
+
+    def run_one(self, op, scheduled, stats):
+        status = 0
+        try:
+            with urllib.request.urlopen(self.request(op), timeout=self.args.timeout) as res:
+                res.read()
+                status = res.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception:
+            status = -1  # 接続エラー / タイムアウト
+        stats.record(op, status, time.monotonic() - scheduled, 200 <= status < 300)
+
+
+def sample_lock_waits(db_url, stop, samples):
+    import psycopg2  # requirements.txt に含まれる
+
+    conn = psycopg2.connect(db_url)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            while not stop.is_set():
+                cur.execute(
+                    "SELECT count(*) FROM pg_stat_activity "
+                    "WHERE wait_event_type = 'Lock' AND datname = current_database()"
+                )
+                samples.append(cur.fetchone()[0])
+                stop.wait(1.0)
+    finally:
+        conn.close()
+
+
+def report(stats, elapsed, lock_samples):
+    total = sum(len(v) for v in stats.latency.values())
+    errors = sum(stats.errors.values())
+    print(f"\nduration={elapsed:.1f}s requests={total} throughput={total / elapsed:.1f} req/s "
+          f"errors={errors} ({(errors / total * 100) if total else 0:.2f}%)")
+    print(f"{'op':<10}{'n':>8}{'rps':>9}{'err%':>8}{'p50ms':>9}{'p90ms':>9}{'p99ms':>9}{'maxms':>9}")
+    for op in OPS:
+        lat = sorted(stats.latency.get(op, []))
+        if not lat:
+            continue
+        n = len(lat)
+        print(f"{op:<10}{n:>8}{n / elapsed:>9.1f}{stats.errors[op] / n * 100:>8.2f}"
+              f"{percentile(lat, 50) * 1000:>9.1f}{percentile(lat, 90) * 1000:>9.1f}"
+              f"{percentile(lat, 99) * 1000:>9.1f}{lat[-1] * 1000:>9.1f}")
+
+    codes = sorted(stats.status.items())
+    print("status:", ", ".join(f"{op}:{code}={n}" for (op, code), n in codes))
+    if lock_samples:
+        print(f"db lock waits: max={max(lock_samples)} avg={sum(lock_samples) / len(lock_samples):.2f} "
+              f"(sessions waiting on locks, sampled {len(lock_samples)}x)")
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--base-url", default="http://127.0.0.1:8000/api")
+    p.add_argument("--user-metric", default="sleep")
+    p.add_argument("--dataset", default="japan-mountains")
+    p.add_argument("--metric", default="height_m")
+    p.add_argument("--mix", default="submit=3,hensachi=4,history=2,ranking=1")
+    p.add_argument("--rps", type=float, default=50)
+    p.add_argument("--duration", type=float, default=30, help="seconds")
+    p.add_argument("--users", type=int, default=500, help="simulated user_hash clients")
+    p.add_argument("--concurrency", type=int, default=64, help="max in-flight requests")
+    p.add_argument("--timeout", type=float, default=10)
+    p.add_argument("--mean", type=float, default=7.0, help="submitted values ~ N(mean, std)")
+    p.add_argument("--std", type=float, default=1.5)
+    p.add_argument("--db-url", default="", help="Postgres URL to sample lock waits")
+    p.add_argument("--seed", type=int, default=None)
+    args = p.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    args.base_url = args.base_url.rstrip("/")
+    mix = parse_mix(args.mix)
+    ops, weights = list(mix.keys()), list(mix.values())
+
+    client = Client(args)
+    stats = Stats()
+    stop = threading.Event()
+    lock_samples = []
+    sampler = None
+    if args.db_url:
+        sampler = threading.Thread(target=sample_lock_waits, args=(args.db_url, stop, lock_samples), daemon=True)
+        sampler.start()
+
+    interval = 1.0 / args.rps
+    start = time.monotonic()
+    n = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        while True:
+            scheduled = start + n * interval
+            if scheduled - start >= args.duration:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(client.run_one, random.choices(ops, weights)[0], scheduled, stats)
+            n += 1
+    elapsed = time.monotonic() - start
+
+    stop.set()
+    if sampler is not None:
+        sampler.join(timeout=2)
+    report(stats, elapsed, lock_samples)
+
+
+if __name__ == "__main__":
+    main()
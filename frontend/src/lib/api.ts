@@ -1,5 +1,6 @@
 import type {
   Dataset,
+  DatasetOverviewResponse,
   MetricHensachiResponse,
   UserMetricHensachiResponse,
   ApexRankHensachiResponse,
@@ -50,6 +51,12 @@ export function listDatasetMetrics(datasetSlug: string) {
   );
 }
 
+export function getDatasetOverview(datasetSlug: string, top = 5) {
+  return apiGet<DatasetOverviewResponse>(
+    `/datasets/${datasetSlug}/overview/?top=${top}`
+  );
+}
+
 export function getMetricHensachi(datasetSlug: string, metricKey: string) {
   return apiGet<MetricHensachiResponse>(
     `/datasets/${datasetSlug}/metrics/${metricKey}/hensachi/`
@@ -67,6 +74,36 @@ export function submitUserValue(
   });
 }
 
+export type BulkUserValueEntry = {
+  user_metric: string;
+  value: number;
+  client_id: string; // crypto.randomUUID() などで採番し、再送時も同じ値を使う
+  client_ts?: string;
+};
+
+export type BulkSubmitResponse = {
+  user_hash: string;
+  created: number;
+  duplicate: number;
+  invalid: number;
+  results: {
+    client_id?: string;
+    status: "created" | "duplicate" | "invalid";
+    errors?: Record<string, string[]>;
+  }[];
+};
+
+// オフラインでためた値をまとめて送る（client_id で冪等）
+export function submitUserValuesBulk(
+  userHash: string,
+  entries: BulkUserValueEntry[]
+) {
+  return apiPost<BulkSubmitResponse>(`/u/submit-bulk/`, {
+    user_hash: userHash,
+    entries,
+  });
+}
+
 export type UserMetricHensachiExtendedResponse = UserMetricHensachiResponse & {
   diff?: string;
   rank?: number;
@@ -84,6 +121,7 @@ export type UserMetricHistoryItem = {
   id: number;
   value: string;
   created_at: string | null;
+  client_ts?: string | null;
 };
 
 export type UserMetricHistoryResponse = {
@@ -111,3 +149,30 @@ export function getApexRankHensachi(rankCode: string) {
   return apiGet<ApexRankHensachiResponse>(`/apex/rank/hensachi/${rankCode}/`);
 }
 
+
+export type UserMetricLiveStats = {
+  user_metric: string;
+  count: number;
+  mean: string | null;
+  std: string | null;
+  unit: string;
+  you?: { value: string; hensachi: string } | null;
+};
+
+// SSE で母集団の統計を購読する（戻り値で購読解除）
+export function subscribeUserMetricStats(
+  userMetricSlug: string,
+  onStats: (stats: UserMetricLiveStats) => void,
+  userHash?: string
+): () => void {
+  const API_BASE = getApiBase();
+  if (!API_BASE) {
+    throw new Error("NEXT_PUBLIC_API_BASE is not set (Vercel Env or .env.local)");
+  }
+  const qs = userHash ? `?${new URLSearchParams({ user_hash: userHash })}` : "";
+  const es = new EventSource(`${API_BASE}/u/${userMetricSlug}/stream/${qs}`);
+  es.addEventListener("stats", (ev) => {
+    onStats(JSON.parse((ev as MessageEvent).data));
+  });
+  return () => es.close();
+}
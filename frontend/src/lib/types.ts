@@ -21,6 +21,31 @@ export type MetricHensachiResponse = {
   results: MetricHensachiRow[];
 };
 
+export type DatasetOverviewMetric = {
+  key: string;
+  name: string;
+  unit: string;
+  higher_is_better: boolean;
+  count: number;
+  mean: string | null;
+  std: string | null;
+  min: string | null;
+  max: string | null;
+  top: {
+    rank: number;
+    item: { key: string; name: string };
+    value: string;
+    hensachi: string;
+  }[];
+};
+
+export type DatasetOverviewResponse = {
+  dataset: string;
+  name: string;
+  top: number;
+  metrics: DatasetOverviewMetric[];
+};
+
 export type UserMetricHensachiResponse = {
   user_metric: string;
   x: string;